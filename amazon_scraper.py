@@ -2,26 +2,38 @@ from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException
+from selenium.common.exceptions import TimeoutException, WebDriverException
 from selenium.webdriver.common.action_chains import ActionChains
 from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
-from bs4 import BeautifulSoup
-import html2text
+from bs4 import BeautifulSoup, FeatureNotFound, NavigableString, SoupStrainer, Tag
 import time
 import random
 from datetime import datetime
 import logging
 import os
 import asyncio
+import csv
+import io
+import itertools
 import json
+from dataclasses import dataclass, asdict, field
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import contextlib
+from typing import List, Optional
+from collections import OrderedDict
 import platform
 import re
-import uuid
+import threading
 import traceback
-from Screenshot import Screenshot
+from urllib.parse import unquote, urlencode
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:  # selectolax is optional, only needed for the 'selectolax' parser backend
+    LexborHTMLParser = None
 
 # Configure logging
 logging.basicConfig(
@@ -33,21 +45,260 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Global variables for session management
-current_driver = None
-last_search_time = None
-current_session_id = None
-SEARCH_TIMEOUT = 300  # 5 minutes timeout for search session
-driver_lock = False  # Lock to prevent multiple browser instances
-
-# Configure html2text
-text_maker = html2text.HTML2Text()
-text_maker.ignore_links = True  # Ignore links to reduce output size
-text_maker.ignore_images = True  # Ignore images to reduce output size
-text_maker.ignore_emphasis = False
-text_maker.body_width = 0  # Don't wrap text
-text_maker.protect_links = True  # Don't wrap links
-text_maker.unicode_snob = True  # Use Unicode characters
+# Browser session management
+SEARCH_TIMEOUT = 300  # 5 minutes before an idle browser session is quit
+IDLE_EVICTION_INTERVAL = SEARCH_TIMEOUT / 5  # How often the pool looks for idle browsers to quit
+BROWSER_POOL_SIZE = int(os.getenv('BROWSER_POOL_SIZE', '2'))  # Maximum concurrent browsers
+
+# Resolved chromedriver binary, persisted so restarts skip the webdriver_manager lookup
+CHROMEDRIVER_CACHE_FILE = os.getenv(
+    'CHROMEDRIVER_CACHE_FILE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'amazon_scraper', 'chromedriver.json')
+)
+chromedriver_path = None
+chromedriver_lock = threading.Lock()
+
+# Browsers the servers launch before accepting requests; 0 keeps the lazy cold start
+WARM_START_BROWSERS = int(os.getenv('WARM_START_BROWSERS', '0'))
+
+# Search navigation: 'direct' loads the results URL, 'homepage' types the term into the search box
+AMAZON_URL = "https://www.amazon.com"
+NAVIGATION_MODES = ('direct', 'homepage')
+SEARCH_SORT_ORDERS = {
+    'relevance': 'relevanceblender',
+    'price-asc': 'price-asc-rank',
+    'price-desc': 'price-desc-rank',
+    'reviews': 'review-rank',
+    'newest': 'date-desc-rank'
+}
+
+# Batch searches run this many terms at once and start at most BATCH_SEARCHES_PER_MINUTE
+# browser searches between them (cache hits are free); 0 disables the rate limit
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', str(BROWSER_POOL_SIZE)))
+BATCH_SEARCHES_PER_MINUTE = float(os.getenv('BATCH_SEARCHES_PER_MINUTE', '12'))
+
+# Every page navigation takes a token from one limiter whose budget comes from the
+# safety_controls section of mcp_config.json. With NAVIGATION_MAX_WAIT set, a navigation
+# that would queue longer than that many seconds fails fast with RateLimitExceeded.
+MCP_CONFIG_PATH = os.getenv(
+    'MCP_CONFIG_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mcp_config.json')
+)
+DEFAULT_NAVIGATIONS_PER_MINUTE = 30
+NAVIGATION_MAX_WAIT = float(os.environ['NAVIGATION_MAX_WAIT']) if os.getenv('NAVIGATION_MAX_WAIT') else None
+
+# Readiness waits poll the page instead of sleeping a fixed time
+PAGE_WAIT_TIMEOUT = float(os.getenv('PAGE_WAIT_TIMEOUT', '10'))  # Upper bound for one wait
+WAIT_POLL_INTERVAL = 0.25
+CARD_SETTLE_POLLS = 2  # Unchanged card count and page height readings that mean loading is done
+CAPTCHA_FORM_SELECTOR = 'form[action*="validateCaptcha"]'
+SEARCH_PAGE_READY_SELECTOR = f'div.s-main-slot, {CAPTCHA_FORM_SELECTOR}'
+
+# Blocking browser work runs on this executor so it never stalls the event loop
+BROWSER_WORKERS = int(os.getenv('BROWSER_WORKERS', str(BROWSER_POOL_SIZE)))
+browser_executor = ThreadPoolExecutor(max_workers=BROWSER_WORKERS, thread_name_prefix='browser')
+
+# Search result cache
+CACHE_TTL = int(os.getenv('SEARCH_CACHE_TTL', '600'))  # Seconds before a cached search goes stale
+CACHE_MAX_ENTRIES = int(os.getenv('SEARCH_CACHE_MAX_ENTRIES', '128'))
+
+# Search result parsing
+SEARCH_RESULT_SELECTOR = 'div[data-component-type="s-search-result"]'
+EXTRACTION_MODES = ('script', 'incremental', 'full')
+PARSER_BACKENDS = ('html.parser', 'lxml', 'selectolax')
+# Limits BeautifulSoup tree building to the result cards, skipping navigation,
+# footers and recommendation widgets
+SEARCH_RESULT_STRAINER = SoupStrainer('div', attrs={'data-component-type': 's-search-result'})
+TITLE_SELECTORS = [
+    'h2 a',
+    'h2 span',
+    'a.a-link-normal.a-text-normal'
+]
+PRICE_SELECTORS = [
+    '.a-price .a-offscreen',
+    '.a-price span',
+    '.a-color-price'
+]
+# Structural markers of a sponsored card. The classifier checks these attributes on the
+# card and each element inside it in a single pass, plus the text of the "Sponsored" label.
+SPONSORED_ATTRIBUTE_PATTERNS = {
+    'class': re.compile(r'sponsored|(?:^|\s)(?:AdHolder|s-label-popover-default)(?:\s|$)'),
+    'data-component-type': re.compile(r'^sp-sponsored'),
+    'data-cel-widget': re.compile(r'sponsored')
+}
+SPONSORED_LABELS = frozenset(['sponsored', 'sponsored ad'])
+OUTPUT_FORMATS = ('markdown', 'json', 'jsonl', 'csv', 'tsv')
+# Columns of the csv and tsv formats when no field list is given: the markdown block's content
+DEFAULT_TABLE_FIELDS = ('title', 'price', 'num_reviews', 'sponsored', 'asin', 'rank')
+SPONSORED_FILTERS = ('include', 'exclude', 'only')
+# Markdown line labels by Product field; price is shown as the page's price text
+MARKDOWN_FIELD_LABELS = {
+    'price': 'Price',
+    'price_text': 'Price',
+    'num_reviews': 'Number of Reviews',
+    'sponsored': 'Sponsored',
+    'asin': 'ASIN',
+    'rank': 'Rank',
+    'currency': 'Currency',
+    'star_rating': 'Rating',
+    'repeat_buyers': 'Repeat Buyers',
+    'link': 'Link'
+}
+DEFAULT_MARKDOWN_FIELDS = ('price', 'num_reviews', 'sponsored', 'asin', 'rank')
+# Normalization of the text fields of a result card into numbers
+# The symbol leads on US/UK storefronts ("$1,299.99") and trails on most European ones ("12,99 €")
+PRICE_PATTERN = re.compile(
+    r'(?P<symbol>[^\d\s.,]+)?\s*(?P<amount>\d(?:[\d.,]*\d)?)(?:\s*(?P<trailing_symbol>[^\d\s.,]+))?'
+)
+# "1,234" and "1.234.567": every group after the first is three digits and uses the same separator
+THOUSANDS_GROUPS_PATTERN = re.compile(r'\d{1,3}(?P<separator>[.,])\d{3}(?:(?P=separator)\d{3})*')
+CURRENCY_SYMBOLS = {'$': 'USD', 'US$': 'USD', 'CA$': 'CAD', 'A$': 'AUD', '£': 'GBP', '€': 'EUR', '¥': 'JPY', '₹': 'INR'}
+COUNT_PATTERN = re.compile(r'(?P<number>\d(?:[\d.,]*\d)?)\s*(?P<suffix>[KM])?\+?', re.IGNORECASE)
+COUNT_MULTIPLIERS = {'k': 1000, 'm': 1000000}
+RATINGS_COUNT_PATTERN = re.compile(r'(?P<count>\d(?:[\d.,]*\d)?\s*[KM]?\+?)\s+(?:global\s+)?ratings?\b', re.IGNORECASE)
+STAR_RATING_PATTERN = re.compile(r'(\d(?:\.\d)?) out of 5')
+REPEAT_BUYERS_PATTERN = re.compile(r'(?P<count>\d(?:[\d.,]*\d)?\s*[KM]?\+?)\s+bought multiple times', re.IGNORECASE)
+STAR_RATING_SELECTOR = 'span.a-icon-alt'
+# Words, and every other character except a space, so a tab or newline separator costs
+# a token just like a comma does
+TOKEN_PATTERN = re.compile(r'\w+|[^\w ]')
+ASIN_PATTERN = re.compile(r'[A-Z0-9]{10}')
+# Product paths in result links, including the URL-encoded target of sponsored click links
+ASIN_LINK_PATTERN = re.compile(r'/(?:dp|gp/product|gp/aw/d)/([A-Z0-9]{10})(?=[/?&]|$)')
+
+# Returns [key, rank, outerHTML] for every result card whose data-index/data-asin key
+# is not in arguments[0], so each scroll pass only ships and parses the new cards
+NEW_CARDS_SCRIPT = """
+const seen = new Set(arguments[0]);
+const cards = [];
+document.querySelectorAll('div[data-component-type="s-search-result"]').forEach((card, position) => {
+    const index = card.getAttribute('data-index') || '';
+    const asin = card.getAttribute('data-asin') || '';
+    const key = (index || asin) ? index + ':' + asin : '#' + position;
+    if (seen.has(key)) {
+        return;
+    }
+    seen.add(key);
+    let rank = index;
+    if (!rank && card.parentElement) {
+        const parent = card.parentElement.closest('div[data-index]');
+        rank = parent ? parent.getAttribute('data-index') : '';
+    }
+    cards.push([key, rank, card.outerHTML]);
+});
+return cards;
+"""
+
+# Reads the raw fields of every new result card in the browser (the JavaScript twin of
+# read_card_fields) and returns them as one compact JSON list. arguments[0] holds the
+# keys of cards already extracted and arguments[1] the selector lists.
+CARD_FIELDS_SCRIPT = """
+const seen = new Set(arguments[0]);
+const selectors = arguments[1];
+const text = el => el ? el.textContent : null;
+const first = (card, list) => {
+    for (const selector of list) {
+        const el = card.querySelector(selector);
+        if (el) {
+            return el;
+        }
+    }
+    return null;
+};
+const sponsoredPatterns = Object.entries(selectors.sponsored_attributes).map(
+    ([name, source]) => [name, new RegExp(source)]);
+const sponsoredLabels = new Set(selectors.sponsored_labels);
+const isSponsored = card => {
+    const walker = document.createTreeWalker(card, NodeFilter.SHOW_ELEMENT | NodeFilter.SHOW_TEXT);
+    for (let node = card; node; node = walker.nextNode()) {
+        if (node.nodeType === Node.TEXT_NODE) {
+            if (sponsoredLabels.has(node.nodeValue.trim().toLowerCase())) {
+                return true;
+            }
+            continue;
+        }
+        for (const [name, pattern] of sponsoredPatterns) {
+            const value = node.getAttribute(name);
+            if (value && pattern.test(value)) {
+                return true;
+            }
+        }
+    }
+    return false;
+};
+const cards = [];
+document.querySelectorAll('div[data-component-type="s-search-result"]').forEach((card, position) => {
+    const index = card.getAttribute('data-index') || '';
+    const asin = card.getAttribute('data-asin') || '';
+    const key = (index || asin) ? index + ':' + asin : '#' + position;
+    if (seen.has(key)) {
+        return;
+    }
+    seen.add(key);
+    let rank = index;
+    if (!rank && card.parentElement) {
+        const parent = card.parentElement.closest('div[data-index]');
+        rank = parent ? parent.getAttribute('data-index') : '';
+    }
+    const titleElement = first(card, selectors.title);
+    const fields = {
+        key: key,
+        title: text(titleElement),
+        link: titleElement ? (titleElement.getAttribute('href') || '') : '',
+        price: text(first(card, selectors.price)),
+        ratings_label: null,
+        review_abbr: null,
+        repeat_buyers: null,
+        star_label: null,
+        sponsored: isSponsored(card),
+        asin: asin,
+        rank: rank
+    };
+    const reviewsBlock = card.querySelector("div[data-cy='reviews-block']");
+    if (reviewsBlock) {
+        const ratings = reviewsBlock.querySelector("a[aria-label*='ratings']");
+        if (ratings) {
+            fields.ratings_label = ratings.getAttribute('aria-label') || '';
+        } else {
+            fields.review_abbr = text(reviewsBlock.querySelector('span.a-size-small.puis-normal-weight-text.s-underline-text'));
+        }
+        fields.repeat_buyers = text(reviewsBlock.querySelector('span.a-size-base.a-color-secondary'));
+        fields.star_label = text(reviewsBlock.querySelector(selectors.star_rating));
+    }
+    cards.push(fields);
+});
+return JSON.stringify(cards);
+"""
+CARD_SELECTORS = {
+    'title': TITLE_SELECTORS,
+    'price': PRICE_SELECTORS,
+    'star_rating': STAR_RATING_SELECTOR,
+    'sponsored_attributes': {name: pattern.pattern for name, pattern in SPONSORED_ATTRIBUTE_PATTERNS.items()},
+    'sponsored_labels': sorted(SPONSORED_LABELS)
+}
+
+def build_search_url(search_term, page=None, sort=None):
+    """Build an Amazon search results URL
+
+    Args:
+        search_term (str): The search term, URL-encoded here
+        page (int): Result page number, starting at 1
+        sort (str): One of SEARCH_SORT_ORDERS, or None for Amazon's default order
+
+    Returns:
+        str: The search results URL
+    """
+    params = {'k': search_term}
+    if sort is not None:
+        if sort not in SEARCH_SORT_ORDERS:
+            raise ValueError(f"sort must be one of {tuple(SEARCH_SORT_ORDERS)}")
+        params['s'] = SEARCH_SORT_ORDERS[sort]
+    if page is not None:
+        if page < 1:
+            raise ValueError("page must be 1 or greater")
+        if page > 1:
+            params['page'] = page
+    return f"{AMAZON_URL}/s?{urlencode(params)}"
 
 def get_random_user_agent():
     """Return a random modern user agent"""
@@ -59,27 +310,57 @@ def get_random_user_agent():
     ]
     return random.choice(user_agents)
 
-def setup_driver():
-    """Set up and configure Chrome WebDriver with human-like behavior"""
-    global current_driver, current_session_id, driver_lock
-    
-    # If we already have a valid driver, return it
-    if current_driver:
+def resolve_chromedriver_path(stale_path=None):
+    """Return the chromedriver binary path, resolving it at most once
+
+    The first resolution is saved to CHROMEDRIVER_CACHE_FILE. Later calls, including
+    calls after a restart, reuse the saved path while the binary still exists, so they
+    need no network lookup or download.
+
+    Args:
+        stale_path (str): A pinned path that failed to start a browser session, e.g.
+            after Chrome auto-updated past it. It is resolved again with
+            webdriver_manager and re-pinned, unless another thread already did so.
+
+    Returns:
+        str: Path to the chromedriver binary
+    """
+    global chromedriver_path
+    with chromedriver_lock:
+        if chromedriver_path and chromedriver_path != stale_path and os.path.exists(chromedriver_path):
+            return chromedriver_path
+        if stale_path:
+            logger.warning(f"Pinned chromedriver {stale_path} failed to start a session, resolving it again")
+            chromedriver_path = None
+        
         try:
-            # Test if driver is still responsive
-            current_driver.current_url
-            logger.info(f"Reusing existing browser session {current_session_id}")
-            return current_driver
-        except Exception as e:
-            logger.warning(f"Existing driver not responsive: {str(e)}")
-            cleanup_driver()
-    
-    if driver_lock:
-        logger.warning("Browser setup already in progress")
-        return None
+            with open(CHROMEDRIVER_CACHE_FILE, encoding='utf-8') as f:
+                cached_path = json.load(f).get('path')
+            if cached_path and cached_path != stale_path and os.access(cached_path, os.X_OK):
+                logger.info(f"Using pinned chromedriver: {cached_path}")
+                chromedriver_path = cached_path
+                return chromedriver_path
+        except (OSError, ValueError) as e:
+            logger.debug(f"No usable chromedriver cache: {str(e)}")
         
+        logger.info("Resolving chromedriver with webdriver_manager...")
+        chromedriver_path = ChromeDriverManager().install()
+        try:
+            os.makedirs(os.path.dirname(CHROMEDRIVER_CACHE_FILE), exist_ok=True)
+            with open(CHROMEDRIVER_CACHE_FILE, 'w', encoding='utf-8') as f:
+                json.dump({'path': chromedriver_path, 'resolved_at': datetime.now().isoformat()}, f)
+        except OSError as e:
+            logger.warning(f"Could not save chromedriver path: {str(e)}")
+        return chromedriver_path
+
+def setup_driver():
+    """Create and configure a new Chrome WebDriver with human-like behavior
+
+    Returns:
+        The new WebDriver, or None if the browser could not be started
+    """
+    driver = None
     try:
-        driver_lock = True
         logger.info("Setting up Chrome WebDriver...")
         chrome_options = Options()
         # chrome_options.add_argument('--headless')  # Commented out for testing
@@ -107,71 +388,276 @@ def setup_driver():
         chrome_options.add_argument('--disable-features=TranslateUI')
         chrome_options.add_argument('--disable-features=NetworkService')
         
-        service = Service(ChromeDriverManager().install())
-        current_driver = webdriver.Chrome(service=service, options=chrome_options)
-        
-        # Generate a new session ID
-        current_session_id = str(uuid.uuid4())
-        logger.info(f"Created new browser session with ID: {current_session_id}")
+        driver_path = resolve_chromedriver_path()
+        try:
+            driver = webdriver.Chrome(service=Service(driver_path), options=chrome_options)
+        except WebDriverException as e:
+            # Usually Chrome auto-updated past the pinned chromedriver; re-pin and retry once
+            logger.warning(f"Could not start Chrome with {driver_path}: {str(e)}")
+            driver_path = resolve_chromedriver_path(stale_path=driver_path)
+            driver = webdriver.Chrome(service=Service(driver_path), options=chrome_options)
+        logger.info(f"Created new browser session with ID: {driver.session_id}")
         
         # Test the driver
         logger.info("Testing Chrome WebDriver...")
-        current_driver.get("about:blank")
+        driver.get("about:blank")
         
         logger.info("Successfully created and tested Chrome WebDriver instance")
-        return current_driver
+        return driver
     except Exception as e:
         logger.error(f"Failed to setup Chrome driver: {str(e)}")
         logger.error(f"Traceback: {traceback.format_exc()}")
-        cleanup_driver()
+        if driver:
+            quit_driver(driver)
         return None
-    finally:
-        driver_lock = False
 
-def cleanup_driver():
-    """Clean up the current driver instance"""
-    global current_driver, last_search_time, current_session_id
-    if current_driver:
-        try:
-            logger.info(f"Cleaning up browser session with ID: {current_session_id}")
-            current_driver.quit()
-        except Exception as e:
-            logger.error(f"Error during driver cleanup: {str(e)}")
-        finally:
-            current_driver = None
-            last_search_time = None
-            current_session_id = None
-
-def is_search_session_valid():
-    """Check if the current search session is still valid"""
-    global last_search_time, current_driver, current_session_id
-    if not current_driver or not last_search_time or not current_session_id:
-        logger.warning("No active search session found")
-        return False
-    
+def quit_driver(driver):
+    """Quit a browser, logging rather than raising on failure"""
     try:
-        # Test if driver is still responsive
-        current_driver.current_url
-        current_time = time.time()
-        if current_time - last_search_time > SEARCH_TIMEOUT:
-            logger.warning(f"Search session {current_session_id} expired")
-            cleanup_driver()
-            return False
+        logger.info(f"Cleaning up browser session with ID: {driver.session_id}")
+        driver.quit()
+    except Exception as e:
+        logger.error(f"Error during driver cleanup: {str(e)}")
+
+def is_driver_healthy(driver):
+    """Probe whether a browser still responds"""
+    try:
+        driver.current_url
         return True
     except Exception as e:
-        logger.warning(f"Driver for session {current_session_id} is no longer responsive: {str(e)}")
-        cleanup_driver()
+        logger.warning(f"Driver for session {driver.session_id} is no longer responsive: {str(e)}")
         return False
 
-def get_current_driver():
-    """Get the current driver instance"""
-    global current_driver
-    return current_driver
+class DriverPool:
+    """Thread-safe, bounded pool of Chrome WebDriver instances
+
+    Callers check a browser out, use it exclusively, and check it back in. When every
+    browser is in use and the pool is at max_size, checkout waits for one to be returned.
+    Idle browsers are health-probed before reuse and quit once idle for idle_timeout seconds;
+    a daemon thread, started with the first checkin, evicts them every eviction_interval seconds.
+    """
+
+    def __init__(self, max_size=BROWSER_POOL_SIZE, idle_timeout=SEARCH_TIMEOUT, factory=setup_driver,
+                 eviction_interval=IDLE_EVICTION_INTERVAL):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.eviction_interval = eviction_interval
+        self._factory = factory
+        self._evictor = None
+        self._stop_evicting = threading.Event()
+        self._condition = threading.Condition()
+        self._idle = []  # (driver, returned_at) pairs, most recently returned last
+        self._size = 0  # Browsers checked out, idle, or being started
+        self._closed = False
+        self.created = 0
+        self.evicted = 0
+        self.waiting = 0
+
+    def checkout(self, timeout=None):
+        """Return a healthy browser, starting one if the pool has room
+
+        Args:
+            timeout (float): Seconds to wait for a free browser, or None to wait indefinitely
+
+        Returns:
+            A WebDriver for the caller's exclusive use until checkin
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            driver = None
+            with self._condition:
+                while True:
+                    if self._closed:
+                        raise RuntimeError("Driver pool is closed")
+                    expired = self._take_expired()
+                    if expired or self._idle or self._size < self.max_size:
+                        break
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError(f"No browser became free within {timeout} seconds")
+                    self.waiting += 1
+                    try:
+                        self._condition.wait(remaining)
+                    finally:
+                        self.waiting -= 1
+                if not expired:
+                    if self._idle:
+                        driver, _ = self._idle.pop()
+                    else:
+                        self._size += 1
+            
+            # Quit, probe and start browsers outside the lock
+            if expired:
+                for stale_driver in expired:
+                    quit_driver(stale_driver)
+                self._release_slots(len(expired))
+                continue
+            if driver is not None:
+                if is_driver_healthy(driver):
+                    logger.info(f"Reusing browser session {driver.session_id}")
+                    return driver
+                quit_driver(driver)
+                self._release_slots(1)
+                continue
+            try:
+                driver = self._factory()
+            except Exception:
+                self._release_slots(1)
+                raise
+            if driver is None:
+                self._release_slots(1)
+                raise Exception("Failed to setup browser")
+            with self._condition:
+                self.created += 1
+            return driver
+
+    def warm(self, count):
+        """Start browsers in parallel until count are idle, without exceeding max_size
+
+        Args:
+            count (int): Number of idle browsers wanted
+
+        Returns:
+            int: Number of browsers started
+        """
+        with self._condition:
+            to_start = min(count - len(self._idle), self.max_size - self._size)
+            if to_start <= 0:
+                return 0
+            self._size += to_start
+        
+        def start_browser(_):
+            try:
+                return self._factory()
+            except Exception as e:
+                logger.error(f"Failed to start browser during warm-up: {str(e)}")
+                return None
+        
+        with ThreadPoolExecutor(max_workers=to_start, thread_name_prefix='warm') as executor:
+            drivers = list(executor.map(start_browser, range(to_start)))
+        started = [driver for driver in drivers if driver is not None]
+        with self._condition:
+            self.created += len(started)
+        self._release_slots(to_start - len(started))
+        for driver in started:
+            self.checkin(driver)
+        return len(started)
+
+    def checkin(self, driver):
+        """Return a browser to the pool, quitting it if the pool has been closed"""
+        with self._condition:
+            if not self._closed:
+                self._idle.append((driver, time.monotonic()))
+                self._condition.notify()
+                self._start_evictor()
+                return
+        quit_driver(driver)
+        self._release_slots(1)
+
+    def discard(self, driver):
+        """Quit a checked-out browser that should not be reused"""
+        quit_driver(driver)
+        self._release_slots(1)
+
+    def evict_idle(self):
+        """Quit browsers that have been idle longer than idle_timeout"""
+        with self._condition:
+            expired = self._take_expired()
+        for driver in expired:
+            quit_driver(driver)
+        self._release_slots(len(expired))
+
+    def close(self):
+        """Quit every idle browser; browsers still in use are quit when checked in"""
+        with self._condition:
+            self._closed = True
+            idle = [driver for driver, _ in self._idle]
+            self._idle = []
+            self._condition.notify_all()
+        self._stop_evicting.set()
+        for driver in idle:
+            quit_driver(driver)
+        self._release_slots(len(idle))
+
+    def stats(self):
+        """Return pool size and usage counters"""
+        with self._condition:
+            return {
+                'max_size': self.max_size,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'waiting': self.waiting,
+                'created': self.created,
+                'evicted': self.evicted
+            }
 
-def update_search_time():
-    """Update the last search time"""
-    global last_search_time
-    last_search_time = time.sleep(random.uniform(0.5, 1.5))
+    def _take_expired(self):
+        """Remove and return idle browsers past idle_timeout; call with the lock held"""
+        cutoff = time.monotonic() - self.idle_timeout
+        expired = [driver for driver, returned_at in self._idle if returned_at < cutoff]
+        if expired:
+            self._idle = [(driver, returned_at) for driver, returned_at in self._idle if returned_at >= cutoff]
+            self.evicted += len(expired)
+            logger.info(f"Evicting {len(expired)} idle browser sessions")
+        return expired
+
+    def _release_slots(self, count):
+        """Free pool slots of quit browsers and wake waiting callers"""
+        if not count:
+            return
+        with self._condition:
+            self._size -= count
+            self._condition.notify(count)
+
+    def _start_evictor(self):
+        """Start the idle eviction thread if it is not running; caller holds the lock"""
+        if self._evictor is not None:
+            return
+        self._evictor = threading.Thread(target=self._evict_loop, name='driver-pool-evictor', daemon=True)
+        self._evictor.start()
+
+    def _evict_loop(self):
+        """Evict idle browsers every eviction_interval seconds until the pool is closed"""
+        while not self._stop_evicting.wait(self.eviction_interval):
+            try:
+                self.evict_idle()
+            except Exception as e:
+                logger.error(f"Idle browser eviction failed: {str(e)}")
+
+driver_pool = DriverPool()
+
+def cleanup_driver():
+    """Quit every pooled browser"""
+    driver_pool.close()
+
+startup_stats = {
+    'warm_start_seconds': None,
+    'chromedriver_resolve_seconds': None,
+    'browsers_started': 0,
+    'first_request_seconds': None
+}
+
+def warm_start(browser_count):
+    """Pin the chromedriver binary and launch browsers before serving requests
+
+    Args:
+        browser_count (int): Number of browsers to launch, capped at the pool size
+
+    Returns:
+        dict: startup_stats with the timings of this warm start
+    """
+    started_at = time.perf_counter()
+    resolve_chromedriver_path()
+    startup_stats['chromedriver_resolve_seconds'] = round(time.perf_counter() - started_at, 3)
+    startup_stats['browsers_started'] = driver_pool.warm(browser_count)
+    startup_stats['warm_start_seconds'] = round(time.perf_counter() - started_at, 3)
+    logger.info(
+        f"Warm start finished in {startup_stats['warm_start_seconds']}s "
+        f"(chromedriver {startup_stats['chromedriver_resolve_seconds']}s, "
+        f"{startup_stats['browsers_started']}/{browser_count} browsers started)"
+    )
+    return startup_stats
 
 def human_like_mouse_movement(driver, element):
     """Simulate human-like mouse movement to an element"""
@@ -184,7 +670,7 @@ def human_like_typing(element, text):
     """Simulate human-like typing with random delays"""
     for char in text:
         element.send_keys(char)
-        time.sleep(random.uniform(0.1, 0.3))
+        pause(random.uniform(0.1, 0.3))
 
 def human_like_scroll(driver):
     """Simulate human-like scrolling behavior"""
@@ -243,15 +729,18 @@ def handle_captcha(driver, max_retries=3):
                 # Try multiple sophisticated strategies to bypass CAPTCHA
                 strategies = [
                     # Strategy 1: Refresh with different parameters
-                    lambda: driver.get(f"{driver.current_url}?{random.randint(1000, 9999)}"),
+                    lambda: navigate(driver, f"{driver.current_url}?{random.randint(1000, 9999)}"),
                     # Strategy 2: Clear cookies and refresh
-                    lambda: (driver.delete_all_cookies(), driver.refresh()),
+                    lambda: (driver.delete_all_cookies(), refresh_page(driver)),
                     # Strategy 3: Go to homepage and wait
-                    lambda: (driver.get('https://www.amazon.com'), time.sleep(random.uniform(3, 5))),
+                    lambda: (navigate(driver, AMAZON_URL), pause(random.uniform(3, 5))),
                     # Strategy 4: Back/Forward with delay
-                    lambda: (driver.back(), time.sleep(random.uniform(2, 4)), driver.forward()),
+                    lambda: (navigation_rate_limiter.acquire(), driver.back(), pause(random.uniform(2, 4)),
+                             navigation_rate_limiter.acquire(), driver.forward()),
                     # Strategy 5: JavaScript redirect with random delay
-                    lambda: (driver.execute_script("window.location.href = 'https://www.amazon.com'"), time.sleep(random.uniform(2, 4)))
+                    lambda: (navigation_rate_limiter.acquire(),
+                             driver.execute_script("window.location.href = 'https://www.amazon.com'"),
+                             pause(random.uniform(2, 4)))
                 ]
                 
                 # Try strategies in random order
@@ -260,12 +749,14 @@ def handle_captcha(driver, max_retries=3):
                     try:
                         logger.info("Trying CAPTCHA bypass strategy...")
                         strategy()
-                        time.sleep(random.uniform(3, 5))
+                        pause(random.uniform(3, 5))
                         
                         # Check if CAPTCHA is still present
                         if not any(indicator in driver.page_source.lower() for indicator in captcha_indicators):
                             logger.info("CAPTCHA bypass successful!")
                             return True
+                    except (RateLimitExceeded, BrowserWorkCancelled):
+                        raise
                     except Exception as e:
                         logger.error(f"Strategy failed: {str(e)}")
                         continue
@@ -274,19 +765,21 @@ def handle_captcha(driver, max_retries=3):
                 if attempt < max_retries - 1:
                     logger.info("All strategies failed, trying with different user agent...")
                     driver.execute_script(f"Object.defineProperty(navigator, 'userAgent', {{get: () => '{get_random_user_agent()}'}});")
-                    driver.refresh()
-                    time.sleep(random.uniform(5, 8))
+                    refresh_page(driver)
+                    pause(random.uniform(5, 8))
                 else:
                     raise Exception("All CAPTCHA bypass strategies failed")
             
             # If no CAPTCHA, proceed
             return True
             
+        except (RateLimitExceeded, BrowserWorkCancelled):
+            raise
         except Exception as e:
             logger.error(f"Error handling CAPTCHA: {str(e)}")
             if attempt == max_retries - 1:
                 raise
-            time.sleep(random.uniform(5, 10))
+            pause(random.uniform(5, 10))
     
     return False
 
@@ -325,337 +818,1829 @@ def take_fullpage_screenshot(driver, output_path):
         logger.error(f"Error taking full-page screenshot: {str(e)}")
         return False
 
-async def perform_amazon_search(driver, search_term):
-    """Perform a search on Amazon with retry mechanism and CAPTCHA handling
+@dataclass
+class Product:
+    """A single search result"""
+    __slots__ = ('title', 'price', 'price_text', 'num_reviews', 'sponsored', 'asin', 'rank', 'link',
+                 'currency', 'star_rating', 'repeat_buyers')
 
-    Args:
-        driver: Selenium WebDriver instance
-        search_term (str): The search term to use
+    title: str
+    price: Optional[float]  # Numeric price, None if the price text could not be parsed
+    price_text: str  # Price as shown on the page, e.g. "$12.99"
+    num_reviews: Optional[int]  # None if the product has no reviews
+    sponsored: bool
+    asin: str
+    rank: str
+    link: str
+    currency: Optional[str]  # ISO code of the price currency, e.g. "USD"
+    star_rating: Optional[float]  # Average rating out of 5
+    repeat_buyers: Optional[int]  # Shoppers who bought the product multiple times
+
+    def to_dict(self, fields=None):
+        """Return the product, or only the named fields, as a JSON-serializable dict"""
+        if fields is None:
+            return asdict(self)
+        return {name: getattr(self, name) for name in fields}
+
+PRODUCT_FIELDS = Product.__slots__
+
+def _rank_number(product):
+    return int(product.rank) if product.rank.isdigit() else None
+
+# Sort keys for order_by; prefix with "-" for descending order
+PRODUCT_SORT_KEYS = {
+    'price': lambda product: product.price,
+    'reviews': lambda product: product.num_reviews,
+    'rating': lambda product: product.star_rating,
+    'rank': _rank_number
+}
+
+@dataclass
+class SearchResults:
+    """The products found by one search"""
+    search_term: str
+    products: List[Product]
+    truncated: bool = False  # True when a Deadline cut the search short
+
+    @property
+    def count(self):
+        return len(self.products)
+
+    def to_dict(self, fields=None):
+        """Return the results as a JSON-serializable dict, with only the named product fields if given"""
+        return {
+            'search_term': self.search_term,
+            'count': self.count,
+            'truncated': self.truncated,
+            'products': [product.to_dict(fields) for product in self.products]
+        }
+
+def parse_price(price_text):
+    """Return the numeric value of a price string such as "$1,299.99", or None"""
+    return parse_price_text(price_text)[0]
+
+def parse_price_text(price_text):
+    """Split a price string such as "$1,299.99", "£1.234,56" or "12,99 €" into its value and currency code
 
     Returns:
-        bool: True if search was successful, False otherwise
+        tuple: (float or None, ISO currency code or None)
+    """
+    match = PRICE_PATTERN.search(price_text)
+    if not match:
+        return None, None
+    currency = CURRENCY_SYMBOLS.get(match.group('symbol')) or CURRENCY_SYMBOLS.get(match.group('trailing_symbol'))
+    return parse_number(match.group('amount')), currency
+
+def parse_number(text):
+    """Return the value of a number written with either "," or "." as the decimal separator
+
+    "1,299.99" and "1.299,99" are both 1299.99: when both separators appear, the last one is
+    the decimal point. A lone separator followed by groups of three digits ("1,234", "1.234")
+    separates thousands, anything else ("12,99", "4,5", "1.2") is a decimal point.
+
+    Returns:
+        float or None: None when the separators do not form a number, e.g. "1,2,3"
     """
+    if '.' in text and ',' in text:
+        decimal_separator = '.' if text.rindex('.') > text.rindex(',') else ','
+        thousands_separator = ',' if decimal_separator == '.' else '.'
+        text = text.replace(thousands_separator, '').replace(decimal_separator, '.')
+    elif THOUSANDS_GROUPS_PATTERN.fullmatch(text):
+        text = text.replace(',', '').replace('.', '')
+    else:
+        text = text.replace(',', '.')
     try:
-        # First perform the search with retry mechanism
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                # Navigate to Amazon
-                driver.get("https://www.amazon.com")
-                time.sleep(random.uniform(2, 4))
-                
-                # Try to find search box
-                try:
-                    search_box = driver.find_element(By.ID, "twotabsearchtextbox")
-                    if search_box:
-                        logger.debug("Found search box")
-                        break
-                except:
-                    logger.warning(f"Attempt {attempt + 1}: Could not find search box, refreshing page...")
-                    driver.refresh()
-                    time.sleep(random.uniform(3, 5))
-                    continue
-                    
-            except Exception as e:
-                logger.warning(f"Attempt {attempt + 1}: Error accessing Amazon: {str(e)}")
-                if attempt < max_retries - 1:
-                    driver.refresh()
-                    time.sleep(random.uniform(3, 5))
-                else:
-                    raise Exception("Failed to access Amazon after multiple attempts")
-        
-        # If we still don't have a search box after all retries, raise an error
-        try:
-            search_box = driver.find_element(By.ID, "twotabsearchtextbox")
-        except:
-            raise Exception("Could not find search box after multiple attempts")
-        
-        # Search for the term
-        human_like_typing(search_box, search_term)
-        search_box.send_keys(Keys.RETURN)
-        time.sleep(random.uniform(3, 5))
-        
+        return float(text)
+    except ValueError:
+        return None
+
+def parse_count(text):
+    """Return the number in a count such as "1,234", "(1.2K)", "4,5K", "12K+" or "2M", or None"""
+    match = COUNT_PATTERN.search(text)
+    if not match:
+        return None
+    number = parse_number(match.group('number'))
+    if number is None:
+        return None
+    suffix = match.group('suffix')
+    if suffix:
+        number *= COUNT_MULTIPLIERS[suffix.lower()]
+    return int(round(number))
+
+def _markdown_value(product, name):
+    if name in ('price', 'price_text'):
+        return product.price_text
+    if name == 'num_reviews':
+        return product.num_reviews if product.num_reviews is not None else 'No reviews'
+    if name == 'sponsored':
+        return 'Yes' if product.sponsored else 'No'
+    value = getattr(product, name)
+    return value if value is not None else 'N/A'
+
+def render_markdown(products, fields=None):
+    """Render products as the markdown block returned by search_amazon
+
+    Args:
+        products (list): Product records
+        fields (list): Product fields to list under each title, defaulting to
+            DEFAULT_MARKDOWN_FIELDS
+
+    Returns:
+        str: Markdown formatted results
+    """
+    fields = [name for name in (fields or DEFAULT_MARKDOWN_FIELDS) if name != 'title']
+    parts = ["## Search Results\n\n"]
+    for i, product in enumerate(products, 1):
+        parts.append(f"{i}. **{product.title}**\n")
+        parts.extend(f"   - {MARKDOWN_FIELD_LABELS[name]}: {_markdown_value(product, name)}\n" for name in fields)
+        parts.append("\n")
+    return ''.join(parts)
+
+def check_product_fields(fields):
+    """Raise ValueError unless fields is None or a list of Product field names"""
+    if fields is None:
+        return
+    unknown = [name for name in fields if name not in PRODUCT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields {unknown}, expected some of {PRODUCT_FIELDS}")
+
+def check_result_options(sponsored='include', order_by=None, fields=None, output_format=None):
+    """Raise ValueError for refine_results or render_results options that would fail
+
+    Servers call this before starting a search, so a typo does not cost a browser run.
+    An output_format of None is not checked, for callers that do not render results.
+    """
+    if output_format is not None and output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"output_format must be one of {OUTPUT_FORMATS}")
+    if sponsored not in SPONSORED_FILTERS:
+        raise ValueError(f"sponsored must be one of {SPONSORED_FILTERS}")
+    if order_by is not None and order_by.lstrip('-') not in PRODUCT_SORT_KEYS:
+        raise ValueError(f"order_by must be one of {tuple(PRODUCT_SORT_KEYS)}, optionally prefixed with '-'")
+    check_product_fields(fields)
+
+def filter_products(products, min_price=None, max_price=None, min_reviews=None, sponsored='include'):
+    """Keep the products that match every given condition
+
+    Products with no price or review count are dropped when a price or review bound is set.
+
+    Args:
+        products (list): Product records
+        min_price (float): Lowest price to keep
+        max_price (float): Highest price to keep
+        min_reviews (int): Fewest reviews to keep
+        sponsored (str): One of SPONSORED_FILTERS: 'include' keeps sponsored products,
+            'exclude' drops them and 'only' keeps nothing else
+
+    Returns:
+        list: The matching products, in their original order
+    """
+    if sponsored not in SPONSORED_FILTERS:
+        raise ValueError(f"sponsored must be one of {SPONSORED_FILTERS}")
+    
+    def matches(product):
+        if sponsored != 'include' and product.sponsored != (sponsored == 'only'):
+            return False
+        if min_price is not None or max_price is not None:
+            if product.price is None:
+                return False
+            if min_price is not None and product.price < min_price:
+                return False
+            if max_price is not None and product.price > max_price:
+                return False
+        if min_reviews is not None and (product.num_reviews is None or product.num_reviews < min_reviews):
+            return False
         return True
-        
-    except Exception as e:
-        logger.error(f"Error performing search: {str(e)}")
-        return False
+    
+    return [product for product in products if matches(product)]
 
-async def get_amazon_search_results(search_term):
+def sort_products(products, order_by):
+    """Sort products by one of PRODUCT_SORT_KEYS, e.g. "price" or "-reviews" for descending
 
-    """Search Amazon and return results"""
-    driver = None
-    try:
-        # Setup new driver instance
-        driver = setup_driver()
-        if not driver:
-            raise Exception("Failed to setup browser")
-            
-        logger.info(f"Starting search for: {search_term}")
-        
-        # Perform the search
-        if not await perform_amazon_search(driver, search_term):
-            raise Exception("Failed to perform search")
-        
-        # Scroll through the page to load all results
-        last_height = driver.execute_script("return document.body.scrollHeight")
-        results = []
-        seen_products = set()  # To avoid duplicates
-        
-        while True:
-            # Scroll down
-            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            time.sleep(random.uniform(2, 4))
-            
-            # Get current page source
-            soup = BeautifulSoup(driver.page_source, 'html.parser')
-            
-            # Process search results
-            for item in soup.select('div[data-component-type="s-search-result"]'):
-                try:
-                    # Try multiple selectors for title and link
-                    title_element = None
-                    title_selectors = [
-                        'h2 a',
-                        'h2 span',
-                        'a.a-link-normal.a-text-normal'
-                    ]
-                    
-                    for title_selector in title_selectors:
-                        title_element = item.select_one(title_selector)
-                        if title_element:
-                            break
-                    
-                    if not title_element:
-                        continue
-                        
-                    title = title_element.text.strip()
-                    if not title:
-                        continue
-                        
-                    # Skip if we've already seen this product
-                    if title in seen_products:
-                        continue
-                    seen_products.add(title)
-                        
-                    # Get product link
-                    link = title_element.get('href', '')
-                    if link and not link.startswith('http'):
-                        link = f"https://www.amazon.com{link}"
-                        
-                    # Try multiple selectors for price
-                    price = None
-                    price_selectors = [
-                        '.a-price .a-offscreen',
-                        '.a-price span',
-                        '.a-color-price'
-                    ]
-                    
-                    for price_selector in price_selectors:
-                        price_element = item.select_one(price_selector)
-                        if price_element:
-                            price = price_element.text.strip()
-                            break
-                            
-                    if not price:
-                        continue
-                        
-                    # Get number of reviews
-                    num_reviews = None
-                    
-                    try:
-                        # Find the reviews block
-                        reviews_block = item.select_one("div[data-cy='reviews-block']")
-                        if reviews_block:
-                            # Get number of ratings from aria-label
-                            ratings_elem = reviews_block.select_one("a[aria-label*='ratings']")
-                            if ratings_elem:
-                                ratings_text = ratings_elem.get('aria-label', '')
-                                logger.debug(f"Found ratings text: {ratings_text}")
-                                # Extract just the number from "119,455 ratings"
-                                num_reviews = ratings_text.split()[0].replace(',', '')
-                                logger.debug(f"Extracted review count: {num_reviews}")
-                            else:
-                                # Fallback to abbreviated count in parentheses
-                                review_abbr = reviews_block.select_one("span.a-size-small.puis-normal-weight-text.s-underline-text")
-                                if review_abbr:
-                                    review_text = review_abbr.text.strip('()')
-                                    logger.debug(f"Found abbreviated review text: {review_text}")
-                                    # Convert K/M to actual numbers
-                                    if 'K' in review_text:
-                                        num_reviews = str(int(float(review_text.replace('K', '')) * 1000))
-                                    elif 'M' in review_text:
-                                        num_reviews = str(int(float(review_text.replace('M', '')) * 1000000))
-                                    else:
-                                        num_reviews = review_text
-                                    logger.debug(f"Converted review count: {num_reviews}")
-                            
-                            # Get number of repeat buyers
-                            repeat_buyers_elem = reviews_block.select_one("span.a-size-base.a-color-secondary")
-                            if repeat_buyers_elem:
-                                repeat_buyers_text = repeat_buyers_elem.text.strip()
-                                logger.debug(f"Found repeat buyers text: {repeat_buyers_text}")
-                                if 'bought multiple times' in repeat_buyers_text:
-                                    # Extract the number and convert K/M to actual numbers
-                                    num_text = repeat_buyers_text.split()[0]
-                                    if 'K' in num_text:
-                                        num_buyers = str(int(float(num_text.replace('K', '')) * 1000))
-                                    elif 'M' in num_text:
-                                        num_buyers = str(int(float(num_text.replace('M', '')) * 1000000))
-                                    else:
-                                        num_buyers = num_text
-                                    logger.debug(f"Extracted repeat buyers: {num_buyers}")
-                    except Exception as e:
-                        logger.warning(f"Error extracting reviews: {str(e)}")
-                    
-                    # Check if sponsored
-                    sponsored = False
-                    sponsored_selectors = [
-                        '.s-label-popover-default',  # Sponsored label
-                        'div[data-component-type="sp-sponsored-result"]',  # Sponsored result container
-                        'div[data-component-type="sp-sponsored-product"]',  # Sponsored product container
-                        'div[data-component-type="sp-sponsored"]',  # Generic sponsored container
-                        'span[data-component-type="sp-sponsored-label"]',  # Sponsored label span
-                        'span[class*="sponsored"]',  # Any span with sponsored in class
-                        'div[class*="sponsored"]',  # Any div with sponsored in class
-                        'div[class*="AdHolder"]',  # Ad holder container
-                        'div[data-cel-widget*="sponsored"]'  # Sponsored widget
-                    ]
-                    
-                    # Check each selector
-                    for selector in sponsored_selectors:
-                        if item.select_one(selector):
-                            sponsored = True
-                            break
-                    
-                    # Also check for sponsored text in the product HTML
-                    if not sponsored:
-                        product_html = str(item)
-                        sponsored_keywords = ['sponsored', 'advertisement', 'ad', 'sponsored product']
-                        if any(keyword in product_html.lower() for keyword in sponsored_keywords):
-                            sponsored = True
-                    
-                    # Get product ASIN
-                    asin = item.get('data-asin', '')
-                    if not asin:
-                        # Try to find ASIN in the product link
-                        try:
-                            link_parts = link.split('/')
-                            for part in link_parts:
-                                if part.startswith('B0'):
-                                    asin = part
-                                    break
-                        except:
-                            asin = 'Not available'
-                    
-                    # Get search rank
-                    rank = item.get('data-index', '')
-                    if not rank:
-                        # Try to find rank from parent elements
-                        try:
-                            parent = item.find_parent('div', {'data-index': True})
-                            if parent:
-                                rank = parent.get('data-index', '')
-                        except:
-                            rank = 'Not available'
-                    
-                    result = {
-                        'title': title,
-                        'price': price,
-                        'num_reviews': num_reviews if num_reviews else 'No reviews',
-                        'sponsored': sponsored,
-                        'asin': asin,
-                        'rank': rank
-                    }
-                    
-                    logger.debug(f"Found product: {result['title']} - {result['price']} - {result['num_reviews']} reviews - ASIN: {result['asin']} - Rank: {result['rank']}")
-                    results.append(result)
-                    
-                except Exception as e:
-                    logger.warning(f"Error processing search result: {str(e)}")
-                    continue
-            
-            # Check if we've reached the end of the page
-            new_height = driver.execute_script("return document.body.scrollHeight")
-            if new_height == last_height:
-                # Try to find and click the "Next" button
-                try:
-                    next_button = driver.find_element(By.CSS_SELECTOR, '.s-pagination-next')
-                    if next_button and not next_button.get_attribute('aria-disabled'):
-                        next_button.click()
-                        time.sleep(random.uniform(3, 5))
-                        last_height = driver.execute_script("return document.body.scrollHeight")
-                        continue
-                except:
-                    pass
-                break
-            last_height = new_height
-        
-        if not results:
-            logger.warning("No products found")
-            # Save the page source for debugging
-            with open('debug_page_source.html', 'w', encoding='utf-8') as f:
-                f.write(driver.page_source)
-            logger.info("Saved page source to debug_page_source.html")
-        
-        # Format results
-        formatted_results = "## Search Results\n\n"
-        for i, result in enumerate(results, 1):
-            formatted_results += f"{i}. **{result['title']}**\n"
-            formatted_results += f"   - Price: {result['price']}\n"
-            formatted_results += f"   - Number of Reviews: {result['num_reviews']}\n"
-            formatted_results += f"   - Sponsored: {'Yes' if result['sponsored'] else 'No'}\n"
-            formatted_results += f"   - ASIN: {result['asin']}\n"
-            formatted_results += f"   - Rank: {result['rank']}\n\n"
-        
-        return formatted_results, len(results)
-        
-    except Exception as e:
-        logger.error(f"Error in search: {str(e)}")
-        logger.error(f"Traceback: {traceback.format_exc()}")
-        raise
+    Products without a value for the key are placed last in either direction.
+    """
+    descending = order_by.startswith('-')
+    name = order_by.lstrip('-')
+    if name not in PRODUCT_SORT_KEYS:
+        raise ValueError(f"order_by must be one of {tuple(PRODUCT_SORT_KEYS)}, optionally prefixed with '-'")
+    key = PRODUCT_SORT_KEYS[name]
+    known = [product for product in products if key(product) is not None]
+    unknown = [product for product in products if key(product) is None]
+    return sorted(known, key=key, reverse=descending) + unknown
 
-async def add_top_sponsored_products_to_cart(search_term, number_of_products):
-    driver = None
-    added_products = []  # List to store titles of successfully added products
-    try:
-        # Setup driver using the existing setup_driver method
-        driver = setup_driver()
-        if not driver:
-            raise Exception("Failed to setup browser")
-            
-        logger.info(f"Starting search for sponsored products: {search_term}")
-        
-        # Construct Amazon search URL from search term
-        search_term_encoded = search_term.replace(' ', '+')
-        amazon_url = f"https://www.amazon.com/s?k={search_term_encoded}"
-        driver.get(amazon_url)
-        
-        # Wait for page to load
-        wait = WebDriverWait(driver, 15)
-        logger.info("Waiting for page to load...")
-        wait.until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, "div.s-main-slot")))
-        logger.info("Page loaded successfully")
-        
-        # Check for captcha
-        if not handle_captcha(driver):
-            raise Exception("Failed to handle CAPTCHA")
-        
-        # Print the page title for debugging
-        logger.info(f"Page title: {driver.title}")
-        
-        # Find all sponsored products using the exact HTML structure
-        sponsored_selectors = [
-            'div[class*="a-section"][class*="a-spacing-small"][class*="puis-padding-left-small"][class*="puis-padding-right-small"]',  # Main sponsored container
-            'div[class*="puis-card-container"]'  # Card container
-        ]
-        
-        sponsored_products = []  # Store both product info and add to cart button
-        for selector in sponsored_selectors:
-            try:
-                elements = driver.find_elements(By.CSS_SELECTOR, selector)
-                logger.info(f"Found {len(elements)} elements with selector: {selector}")
-                
+def refine_results(results, min_price=None, max_price=None, min_reviews=None, sponsored='include', order_by=None):
+    """Filter and sort search results before rendering
+
+    Args:
+        results (SearchResults): The search results, e.g. from the cache, left unchanged
+        min_price, max_price, min_reviews, sponsored: Conditions for filter_products
+        order_by (str): Sort key for sort_products, or None to keep page order
+
+    Returns:
+        SearchResults: The remaining products
+    """
+    products = filter_products(results.products, min_price, max_price, min_reviews, sponsored)
+    if order_by:
+        products = sort_products(products, order_by)
+    return SearchResults(search_term=results.search_term, products=products, truncated=results.truncated)
+
+def render_table(products, fields=None, delimiter=','):
+    """Render products as CSV, or TSV with a tab delimiter, with a header row
+
+    Args:
+        products (list): Product records
+        fields (list): Columns, defaulting to DEFAULT_TABLE_FIELDS
+        delimiter (str): Column separator
+
+    Returns:
+        str: The table, one line per product; missing values are empty cells
+    """
+    fields = fields or DEFAULT_TABLE_FIELDS
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=delimiter, lineterminator='\n')
+    writer.writerow(fields)
+    for product in products:
+        row = []
+        for name in fields:
+            value = getattr(product, name)
+            if value is None:
+                value = ''
+            elif isinstance(value, bool):
+                value = 'true' if value else 'false'
+            row.append(value)
+        writer.writerow(row)
+    return buffer.getvalue()
+
+def render_json_lines(products, fields=None):
+    """Render products as JSON Lines, one object per product"""
+    return ''.join(json.dumps(product.to_dict(fields)) + '\n' for product in products)
+
+def render_results(results, output_format='markdown', fields=None):
+    """Render search results in one of OUTPUT_FORMATS
+
+    Args:
+        results (SearchResults): The search results
+        output_format (str): 'markdown' for the markdown block, 'json' for one structured
+            document, 'jsonl' for one JSON object per product, or 'csv' / 'tsv' for a table
+        fields (list): Product fields to include, or None for the format's default
+
+    Truncated results are flagged by the "truncated" key in JSON and a closing note in
+    markdown; the line-oriented formats carry no flag.
+
+    Returns:
+        str: The rendered results
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"output_format must be one of {OUTPUT_FORMATS}")
+    check_product_fields(fields)
+    if output_format == 'json':
+        return json.dumps(results.to_dict(fields))
+    if output_format == 'jsonl':
+        return render_json_lines(results.products, fields)
+    if output_format == 'csv':
+        return render_table(results.products, fields)
+    if output_format == 'tsv':
+        return render_table(results.products, fields, delimiter='\t')
+    markdown = render_markdown(results.products, fields)
+    if results.truncated:
+        markdown += "_The deadline ran out before the search finished, these are the results found so far._\n"
+    return markdown
+
+def compare_output_formats(results, fields=None):
+    """Measure the size of every output format for the same results
+
+    Tokens are approximated by counting words, punctuation marks, tabs and line breaks,
+    which tracks LLM tokenizers closely enough to rank the formats. Separators count
+    alike whatever the character, so CSV and TSV differ only where CSV has to quote.
+
+    Args:
+        results (SearchResults): The search results, e.g. parsed from a saved page
+        fields (list): Product fields to include, or None for each format's default
+
+    Returns:
+        dict: bytes and approx_tokens for each of OUTPUT_FORMATS
+    """
+    sizes = {}
+    for output_format in OUTPUT_FORMATS:
+        rendered = render_results(results, output_format, fields)
+        sizes[output_format] = {
+            'bytes': len(rendered.encode('utf-8')),
+            'approx_tokens': len(TOKEN_PATTERN.findall(rendered))
+        }
+    return sizes
+
+def has_sponsored_marker(get_attribute):
+    """Check one element's attributes against SPONSORED_ATTRIBUTE_PATTERNS
+
+    Args:
+        get_attribute: Callable returning the element's attribute value as a string, or None
+
+    Returns:
+        bool: True if any attribute carries a sponsored marker
+    """
+    for name, pattern in SPONSORED_ATTRIBUTE_PATTERNS.items():
+        value = get_attribute(name)
+        if value and pattern.search(value):
+            return True
+    return False
+
+def is_sponsored_card(item):
+    """Classify a BeautifulSoup search result card as sponsored in one pass over its nodes
+
+    Args:
+        item: BeautifulSoup element for a `s-search-result` card
+
+    Returns:
+        bool: True if the card or anything inside it carries a sponsored marker
+    """
+    def get_attribute(name):
+        value = node.get(name)
+        # bs4 splits class into a list of tokens
+        return ' '.join(value) if isinstance(value, list) else value
+    
+    for node in itertools.chain((item,), item.descendants):
+        if isinstance(node, Tag):
+            if has_sponsored_marker(get_attribute):
+                return True
+        elif type(node) is NavigableString and node.strip().lower() in SPONSORED_LABELS:
+            return True
+    return False
+
+def is_sponsored_card_lexbor(node):
+    """Classify a selectolax search result card as sponsored in one pass over its nodes
+
+    Args:
+        node: selectolax node for a `s-search-result` card
+
+    Returns:
+        bool: True if the card or anything inside it carries a sponsored marker
+    """
+    for element in node.traverse(include_text=True):
+        if element.tag == '-text':
+            if element.text(deep=False).strip().lower() in SPONSORED_LABELS:
+                return True
+        elif has_sponsored_marker(element.attributes.get):
+            return True
+    return False
+
+def read_card_fields(item, rank=None):
+    """Read the raw fields of a search result card (the Python twin of CARD_FIELDS_SCRIPT)
+
+    Args:
+        item: BeautifulSoup element for a `s-search-result` card
+        rank (str): Search rank read in the browser, if the card was parsed on its own
+
+    Returns:
+        dict: Raw card fields for build_search_result
+    """
+    fields = {
+        'title': None,
+        'link': '',
+        'price': None,
+        'ratings_label': None,
+        'review_abbr': None,
+        'repeat_buyers': None,
+        'star_label': None,
+        'sponsored': False,
+        'asin': item.get('data-asin', ''),
+        'rank': rank
+    }
+    
+    # Try multiple selectors for title and link
+    for title_selector in TITLE_SELECTORS:
+        title_element = item.select_one(title_selector)
+        if title_element:
+            fields['title'] = title_element.text
+            fields['link'] = title_element.get('href', '')
+            break
+    
+    # Try multiple selectors for price
+    for price_selector in PRICE_SELECTORS:
+        price_element = item.select_one(price_selector)
+        if price_element:
+            fields['price'] = price_element.text
+            break
+    
+    # Find the reviews block
+    reviews_block = item.select_one("div[data-cy='reviews-block']")
+    if reviews_block:
+        ratings_elem = reviews_block.select_one("a[aria-label*='ratings']")
+        if ratings_elem:
+            fields['ratings_label'] = ratings_elem.get('aria-label', '')
+        else:
+            review_abbr = reviews_block.select_one("span.a-size-small.puis-normal-weight-text.s-underline-text")
+            if review_abbr:
+                fields['review_abbr'] = review_abbr.text
+        repeat_buyers_elem = reviews_block.select_one("span.a-size-base.a-color-secondary")
+        if repeat_buyers_elem:
+            fields['repeat_buyers'] = repeat_buyers_elem.text
+        star_elem = reviews_block.select_one(STAR_RATING_SELECTOR)
+        if star_elem:
+            fields['star_label'] = star_elem.text
+    
+    # Check if sponsored
+    fields['sponsored'] = is_sponsored_card(item)
+    
+    # Get search rank
+    if fields['rank'] is None:
+        fields['rank'] = item.get('data-index', '')
+        if not fields['rank']:
+            # Try to find rank from parent elements
+            try:
+                parent = item.find_parent('div', {'data-index': True})
+                if parent:
+                    fields['rank'] = parent.get('data-index', '')
+            except:
+                fields['rank'] = 'Not available'
+    
+    return fields
+
+def asin_from_link(link):
+    """Return the ASIN in a product or sponsored click link, or '' if there is none"""
+    match = ASIN_LINK_PATTERN.search(unquote(link))
+    return match.group(1) if match else ''
+
+def product_key(product):
+    """Return the deduplication key of a product
+
+    A valid ASIN is packed into an int, which is smaller than the string and much
+    smaller than a title. Products without one fall back to their title.
+    """
+    if ASIN_PATTERN.fullmatch(product.asin):
+        return int(product.asin, 36)
+    return product.title
+
+def normalize_card_fields(fields):
+    """Convert the text fields of one card into typed values
+
+    Args:
+        fields (dict): Raw card fields from read_card_fields, read_card_fields_lexbor or
+            CARD_FIELDS_SCRIPT
+
+    Returns:
+        dict: price, currency, num_reviews, star_rating and repeat_buyers, each None when
+            the card does not show it
+    """
+    price, currency = parse_price_text(fields.get('price') or '')
+    
+    # "119,455 ratings" on the ratings link, or an abbreviated "(1.2K)" next to the stars
+    num_reviews = None
+    if fields.get('ratings_label') is not None:
+        match = RATINGS_COUNT_PATTERN.search(fields['ratings_label'])
+        num_reviews = parse_count(match.group('count') if match else fields['ratings_label'])
+    elif fields.get('review_abbr') is not None:
+        num_reviews = parse_count(fields['review_abbr'])
+    
+    star_rating = None
+    if fields.get('star_label'):
+        match = STAR_RATING_PATTERN.search(fields['star_label'])
+        if match:
+            star_rating = float(match.group(1))
+    
+    repeat_buyers = None
+    if fields.get('repeat_buyers'):
+        match = REPEAT_BUYERS_PATTERN.search(fields['repeat_buyers'])
+        if match:
+            repeat_buyers = parse_count(match.group('count'))
+    
+    return {
+        'price': price,
+        'currency': currency,
+        'num_reviews': num_reviews,
+        'star_rating': star_rating,
+        'repeat_buyers': repeat_buyers
+    }
+
+def build_search_results(cards):
+    """Build Product records for a batch of cards, skipping cards that cannot be read
+
+    Args:
+        cards (list): Raw card fields, e.g. one page pass worth
+
+    Returns:
+        list: Product records in card order
+    """
+    results = []
+    for fields in cards:
+        try:
+            result = build_search_result(fields)
+        except Exception as e:
+            logger.warning(f"Error processing search result: {str(e)}")
+            continue
+        if result:
+            results.append(result)
+    return results
+
+def build_search_result(fields):
+    """Build a search result from raw card fields
+
+    Args:
+        fields (dict): Raw card fields from read_card_fields or CARD_FIELDS_SCRIPT
+
+    Returns:
+        Product: The product details, or None if the card has no title or price
+    """
+    title = (fields.get('title') or '').strip()
+    if not title:
+        return None
+        
+    # Get product link
+    link = fields.get('link') or ''
+    if link and not link.startswith('http'):
+        link = f"https://www.amazon.com{link}"
+        
+    price = (fields.get('price') or '').strip()
+    if not price:
+        return None
+        
+    # Get product ASIN
+    asin = fields.get('asin') or asin_from_link(link)
+    
+    values = normalize_card_fields(fields)
+    result = Product(
+        title=title,
+        price=values['price'],
+        price_text=price,
+        num_reviews=values['num_reviews'],
+        sponsored=bool(fields.get('sponsored')),
+        asin=asin,
+        rank=fields.get('rank') or '',
+        link=link,
+        currency=values['currency'],
+        star_rating=values['star_rating'],
+        repeat_buyers=values['repeat_buyers']
+    )
+    
+    logger.debug(f"Found product: {result.title} - {result.price_text} - {result.num_reviews} reviews - ASIN: {result.asin} - Rank: {result.rank}")
+    return result
+
+def read_card_fields_lexbor(node, rank=None):
+    """Read the raw fields of a search result card parsed with selectolax's lexbor backend
+
+    Args:
+        node: selectolax node for a `s-search-result` card
+        rank (str): Search rank read in the browser, if the card was parsed on its own
+
+    Returns:
+        dict: Raw card fields for build_search_result
+    """
+    def first(parent, selectors):
+        for selector in selectors:
+            element = parent.css_first(selector)
+            if element is not None:
+                return element
+        return None
+    
+    fields = {
+        'title': None,
+        'link': '',
+        'price': None,
+        'ratings_label': None,
+        'review_abbr': None,
+        'repeat_buyers': None,
+        'star_label': None,
+        'sponsored': False,
+        'asin': node.attributes.get('data-asin') or '',
+        'rank': rank
+    }
+    
+    title_element = first(node, TITLE_SELECTORS)
+    if title_element is not None:
+        fields['title'] = title_element.text()
+        fields['link'] = title_element.attributes.get('href') or ''
+    
+    price_element = first(node, PRICE_SELECTORS)
+    if price_element is not None:
+        fields['price'] = price_element.text()
+    
+    reviews_block = node.css_first("div[data-cy='reviews-block']")
+    if reviews_block is not None:
+        ratings_elem = reviews_block.css_first("a[aria-label*='ratings']")
+        if ratings_elem is not None:
+            fields['ratings_label'] = ratings_elem.attributes.get('aria-label') or ''
+        else:
+            review_abbr = reviews_block.css_first("span.a-size-small.puis-normal-weight-text.s-underline-text")
+            if review_abbr is not None:
+                fields['review_abbr'] = review_abbr.text()
+        repeat_buyers_elem = reviews_block.css_first("span.a-size-base.a-color-secondary")
+        if repeat_buyers_elem is not None:
+            fields['repeat_buyers'] = repeat_buyers_elem.text()
+        star_elem = reviews_block.css_first(STAR_RATING_SELECTOR)
+        if star_elem is not None:
+            fields['star_label'] = star_elem.text()
+    
+    fields['sponsored'] = is_sponsored_card_lexbor(node)
+    
+    if fields['rank'] is None:
+        fields['rank'] = node.attributes.get('data-index') or ''
+        parent = node.parent
+        while not fields['rank'] and parent is not None:
+            if parent.tag == 'div' and 'data-index' in parent.attributes:
+                fields['rank'] = parent.attributes.get('data-index') or ''
+                break
+            parent = parent.parent
+    
+    return fields
+
+def read_cards_from_html(html, parser='html.parser'):
+    """Read the raw fields of every search result card in an HTML document
+
+    Args:
+        html (str): Page source or card markup
+        parser (str): One of PARSER_BACKENDS. 'lxml' and 'selectolax' need the optional
+            lxml and selectolax packages.
+
+    Returns:
+        list: Raw card fields for build_search_result, in document order. The BeautifulSoup
+            backends only build the card subtrees, so a card without its own data-index
+            gets an empty rank.
+    """
+    if parser not in PARSER_BACKENDS:
+        raise ValueError(f"parser must be one of {PARSER_BACKENDS}")
+    
+    if parser == 'selectolax':
+        if LexborHTMLParser is None:
+            raise ImportError("The 'selectolax' parser backend requires the selectolax package")
+        tree = LexborHTMLParser(html)
+        return [read_card_fields_lexbor(node) for node in tree.css(SEARCH_RESULT_SELECTOR)]
+    
+    # Only build trees for the result cards, and free the tree once its cards are read
+    soup = BeautifulSoup(html, parser, parse_only=SEARCH_RESULT_STRAINER)
+    try:
+        return [read_card_fields(item) for item in soup.select(SEARCH_RESULT_SELECTOR)]
+    finally:
+        # A strained soup has no next_element chain, so soup.decompose() alone leaves
+        # the card subtrees in reference cycles for the GC; decompose each one directly
+        for child in list(soup.contents):
+            child.decompose()
+        soup.decompose()
+
+def parse_search_results_html(html, parser='html.parser'):
+    """Parse search result records from saved or live page HTML, without a browser
+
+    Args:
+        html (str): Page source of an Amazon search results page
+        parser (str): One of PARSER_BACKENDS
+
+    Returns:
+        list: Product records as built by build_search_result, in page order
+    """
+    return build_search_results(read_cards_from_html(html, parser))
+
+def check_parser_backends(html, backends=None):
+    """Check that every available parser backend gives identical results for a page
+
+    Use this on saved search pages (such as debug_page_source.html, or the page in
+    tests/fixtures/search_results_page.html) before switching the default parser.
+
+    Args:
+        html (str): Page source of an Amazon search results page
+        backends (list): Backends to compare, defaulting to all of PARSER_BACKENDS
+
+    Returns:
+        dict: Backend name mapped to True if it matched the 'html.parser' reference,
+            False if it differed, or None if the backend is not installed
+    """
+    reference = parse_search_results_html(html, 'html.parser')
+    report = {}
+    for backend in backends or PARSER_BACKENDS:
+        try:
+            results = parse_search_results_html(html, backend)
+        except (ImportError, FeatureNotFound) as e:
+            logger.warning(f"Skipping parser backend {backend}: {str(e)}")
+            report[backend] = None
+            continue
+        report[backend] = results == reference
+        if not report[backend]:
+            logger.warning(f"Parser backend {backend} differs from html.parser")
+    return report
+
+def read_card_fields_in_browser(driver, seen_cards):
+    """Read the raw fields of all new result cards with a single script call
+
+    Args:
+        driver: Selenium WebDriver instance
+        seen_cards (set): Keys of cards already extracted on this page, updated in place
+
+    Returns:
+        list: Raw card fields for build_search_result
+    """
+    payload = driver.execute_script(CARD_FIELDS_SCRIPT, list(seen_cards), CARD_SELECTORS)
+    cards = json.loads(payload)
+    if not isinstance(cards, list):
+        raise ValueError(f"Unexpected card payload type: {type(cards).__name__}")
+    for fields in cards:
+        seen_cards.add(fields.pop('key'))
+    logger.debug(f"Read {len(cards)} new result cards in the browser")
+    return cards
+
+def extract_search_result(item, rank=None):
+    """Extract product details from a single search result card
+
+    Args:
+        item: BeautifulSoup element for a `s-search-result` card
+        rank (str): Search rank read in the browser, if the card was parsed on its own
+
+    Returns:
+        Product: The product details, or None if the card has no title or price
+    """
+    return build_search_result(read_card_fields(item, rank))
+
+class BrowserWorkCancelled(Exception):
+    """Raised inside blocking browser work once the coroutine awaiting it has been cancelled"""
+
+class DeadlineExceeded(BrowserWorkCancelled):
+    """Raised once a request's Deadline has run out; callers return the results found so far"""
+
+class Deadline:
+    """Time budget of one request, shared by every wait, retry and page loop it runs
+
+    Blocking work started with run_blocking(..., deadline=deadline) sees the deadline
+    through check_cancelled, pause and wait_for, which shorten waits to the time left
+    and raise DeadlineExceeded once it is used up.
+    """
+
+    def __init__(self, seconds=None):
+        """
+        Args:
+            seconds (float): Budget in seconds from now, or None for no limit
+        """
+        if seconds is not None and seconds <= 0:
+            raise ValueError("deadline must be greater than 0 seconds")
+        self.seconds = seconds
+        self.expires_at = None if seconds is None else time.monotonic() + seconds
+        self.exceeded = False  # Set once work was cut short by this deadline
+
+    def remaining(self):
+        """Return the seconds left, never below 0, or None without a limit"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def cap(self, seconds):
+        """Return seconds shortened to the time left, where None means no limit"""
+        remaining = self.remaining()
+        if remaining is None:
+            return seconds
+        if seconds is None:
+            return remaining
+        return min(seconds, remaining)
+
+    def check(self, seconds=0.0):
+        """Raise DeadlineExceeded unless more than seconds are left"""
+        remaining = self.remaining()
+        if remaining is not None and remaining <= seconds:
+            self.exceeded = True
+            raise DeadlineExceeded(f"Deadline of {self.seconds}s reached")
+
+    def fork(self):
+        """Return a Deadline with the same expiry and its own exceeded flag, for one of
+        several searches sharing this budget"""
+        forked = Deadline()
+        forked.seconds = self.seconds
+        forked.expires_at = self.expires_at
+        return forked
+
+_browser_work = threading.local()  # cancel_event and deadline of the run_blocking call running on this thread
+
+def check_cancelled():
+    """Raise BrowserWorkCancelled if the run_blocking call running on this thread was
+    cancelled, or DeadlineExceeded once its deadline has passed"""
+    cancel_event = getattr(_browser_work, 'cancel_event', None)
+    if cancel_event is not None and cancel_event.is_set():
+        raise BrowserWorkCancelled("Browser work cancelled")
+    deadline = getattr(_browser_work, 'deadline', None)
+    if deadline is not None:
+        deadline.check()
+
+def pause(seconds):
+    """Sleep for seconds, waking early with BrowserWorkCancelled if the run_blocking call is cancelled
+
+    A pause that would outlast the call's deadline raises DeadlineExceeded straight
+    away, since sleeping would only delay returning the results found so far.
+    """
+    deadline = getattr(_browser_work, 'deadline', None)
+    if deadline is not None:
+        deadline.check(seconds)
+    cancel_event = getattr(_browser_work, 'cancel_event', None)
+    if cancel_event is None:
+        time.sleep(seconds)
+    elif cancel_event.wait(seconds):
+        raise BrowserWorkCancelled("Browser work cancelled")
+
+def _run_cancellable(cancel_event, deadline, func, *args):
+    """Run func with cancel_event and deadline visible to check_cancelled and pause on this thread"""
+    _browser_work.cancel_event = cancel_event
+    _browser_work.deadline = deadline
+    try:
+        return func(*args)
+    finally:
+        _browser_work.cancel_event = None
+        _browser_work.deadline = None
+
+async def run_blocking(func, *args, deadline=None):
+    """Run blocking browser work on the browser executor, keeping the event loop free
+
+    If the awaiting coroutine is cancelled, the work is told to stop at its next
+    check_cancelled or pause (every wait, sleep and navigation checks), and the
+    cancellation is only passed on once the work has stopped. A browser is therefore
+    never handed back to driver_pool while a worker thread is still driving it.
+
+    Args:
+        func: Blocking callable, e.g. a Selenium call or a function that sleeps
+        *args: Arguments for func
+        deadline (Deadline): Time budget the work's waits, pauses and navigations
+            keep to, raising DeadlineExceeded once it is used up
+
+    Returns:
+        The return value of func
+    """
+    loop = asyncio.get_running_loop()
+    cancel_event = threading.Event()
+    work = loop.run_in_executor(
+        browser_executor,
+        functools.partial(_run_cancellable, cancel_event, deadline, func, *args)
+    )
+    try:
+        return await asyncio.shield(work)
+    except asyncio.CancelledError:
+        cancel_event.set()
+        # anyio cancel scopes (Starlette streaming, the MCP session) cancel the task
+        # again at every await, so keep waiting through repeated cancellations
+        while not work.done():
+            try:
+                await asyncio.shield(work)
+            except asyncio.CancelledError:
+                pass
+            except Exception:
+                break
+        # Mark the BrowserWorkCancelled as retrieved, the caller only sees the cancellation
+        if not work.cancelled():
+            work.exception()
+        raise
+
+@contextlib.asynccontextmanager
+async def browser_session(timeout=None, deadline=None):
+    """Check a browser out of driver_pool for the duration of an async with block
+
+    Waiting for a free browser happens on the default executor rather than
+    browser_executor, so queued callers never hold up the workers that running
+    searches need to finish and return their browsers.
+
+    Args:
+        timeout (float): Seconds to wait for a free browser, or None to wait indefinitely
+        deadline (Deadline): Request budget the wait is also limited to; running out
+            raises DeadlineExceeded rather than TimeoutError
+
+    Yields:
+        A WebDriver for the caller's exclusive use
+    """
+    if deadline is not None:
+        timeout = deadline.cap(timeout)
+    loop = asyncio.get_running_loop()
+    checkout = loop.run_in_executor(None, driver_pool.checkout, timeout)
+    try:
+        driver = await asyncio.shield(checkout)
+    except asyncio.CancelledError:
+        # Hand the browser back once the abandoned checkout completes
+        checkout.add_done_callback(
+            lambda future: future.cancelled() or future.exception() or driver_pool.checkin(future.result())
+        )
+        raise
+    except TimeoutError:
+        if deadline is not None:
+            deadline.check()
+        raise
+    try:
+        yield driver
+    finally:
+        driver_pool.checkin(driver)
+
+class RateLimitExceeded(Exception):
+    """Raised when a rate-limited action would have to wait longer than allowed"""
+
+class RateLimiter:
+    """Token bucket limiting how often an action may start, shared by threads and tasks
+
+    Each caller reserves the next free token and then sleeps until it is due, so callers
+    that have to wait are served in arrival order. A rate_per_minute of 0 or less
+    disables the limit. With max_queue_wait set, a caller that would wait longer is
+    rejected with RateLimitExceeded instead of queued.
+    """
+
+    def __init__(self, rate_per_minute, burst=1, max_queue_wait=None):
+        self.rate_per_minute = rate_per_minute
+        self.burst = burst
+        self.max_queue_wait = max_queue_wait
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+        self.acquired = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _reserve(self):
+        """Take a token, possibly one not yet refilled, and return the seconds until it is due"""
+        if self.rate_per_minute <= 0:
+            return 0.0
+        interval = 60.0 / self.rate_per_minute
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) / interval)
+            self._updated_at = now
+            self._tokens -= 1
+            delay = max(0.0, -self._tokens * interval)
+            if self.max_queue_wait is not None and delay > self.max_queue_wait:
+                self._tokens += 1
+                self.rejected += 1
+                raise RateLimitExceeded(
+                    f"Rate limit of {self.rate_per_minute}/min reached, next slot in {delay:.1f}s"
+                )
+        return delay
+
+    def _release(self):
+        """Give back a reserved token whose caller stopped waiting before it was due"""
+        if self.rate_per_minute <= 0:
+            return
+        with self._lock:
+            self._tokens += 1
+
+    def _record(self, delay):
+        """Count a token the caller waited for and used"""
+        if self.rate_per_minute <= 0:
+            return
+        with self._lock:
+            self.acquired += 1
+            self.total_wait += delay
+            self.max_wait = max(self.max_wait, delay)
+
+    def acquire(self):
+        """Block until the caller may start; returns the seconds waited
+
+        A caller cancelled or out of time while waiting gives its token back, so the
+        next caller is not held up for a navigation that never happens.
+        """
+        delay = self._reserve()
+        try:
+            if delay:
+                pause(delay)
+        except BrowserWorkCancelled:
+            self._release()
+            raise
+        self._record(delay)
+        return delay
+
+    async def acquire_async(self, deadline=None):
+        """Wait without blocking the event loop until the caller may start; returns the seconds waited
+
+        With a deadline, the wait stops when it runs out and the caller then finds its
+        deadline exceeded.
+        """
+        delay = self._reserve()
+        wait = deadline.cap(delay) if deadline is not None else delay
+        try:
+            if wait:
+                await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            self._release()
+            raise
+        if wait < delay:
+            # The deadline ran out before the token was due, so the caller will not start
+            self._release()
+        else:
+            self._record(wait)
+        return wait
+
+    def stats(self):
+        """Return the configured rate and wait counters"""
+        with self._lock:
+            return {
+                'rate_per_minute': self.rate_per_minute,
+                'burst': self.burst,
+                'acquired': self.acquired,
+                'rejected': self.rejected,
+                'mean_wait_seconds': round(self.total_wait / self.acquired, 3) if self.acquired else 0.0,
+                'max_wait_seconds': round(self.max_wait, 3)
+            }
+
+batch_rate_limiter = RateLimiter(BATCH_SEARCHES_PER_MINUTE, burst=BATCH_CONCURRENCY)
+
+def load_safety_controls(path=MCP_CONFIG_PATH):
+    """Return the safety_controls section of mcp_config.json, or {} if it cannot be read"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f).get('safety_controls', {})
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read safety controls from {path}: {str(e)}")
+        return {}
+
+def navigation_rate_limit(controls):
+    """Return the navigations per minute allowed by safety controls, 0 when rate limiting is off"""
+    if not controls.get('rate_limiting', True):
+        return 0
+    return float(controls.get('max_requests_per_minute', DEFAULT_NAVIGATIONS_PER_MINUTE))
+
+navigation_rate_limiter = RateLimiter(
+    navigation_rate_limit(load_safety_controls()),
+    max_queue_wait=NAVIGATION_MAX_WAIT
+)
+
+def navigate(driver, url):
+    """Load url once the navigation rate limit allows it"""
+    check_cancelled()
+    navigation_rate_limiter.acquire()
+    driver.get(url)
+
+def refresh_page(driver):
+    """Reload the current page once the navigation rate limit allows it"""
+    check_cancelled()
+    navigation_rate_limiter.acquire()
+    driver.refresh()
+
+class WaitMetrics:
+    """Per-condition timing of readiness waits"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waits = {}
+
+    def record(self, name, seconds, timed_out):
+        """Record one wait on the named condition"""
+        with self._lock:
+            entry = self._waits.setdefault(name, {'count': 0, 'timeouts': 0, 'total_seconds': 0.0, 'max_seconds': 0.0})
+            entry['count'] += 1
+            entry['timeouts'] += int(timed_out)
+            entry['total_seconds'] += seconds
+            entry['max_seconds'] = max(entry['max_seconds'], seconds)
+
+    def stats(self):
+        """Return count, timeouts, and mean and max seconds per condition"""
+        with self._lock:
+            return {
+                name: {
+                    'count': entry['count'],
+                    'timeouts': entry['timeouts'],
+                    'mean_seconds': round(entry['total_seconds'] / entry['count'], 3),
+                    'max_seconds': round(entry['max_seconds'], 3)
+                }
+                for name, entry in self._waits.items()
+            }
+
+wait_metrics = WaitMetrics()
+
+def wait_for(driver, name, condition, timeout=PAGE_WAIT_TIMEOUT):
+    """Poll condition until it returns a truthy value or timeout seconds pass
+
+    A timeout is logged and reported as False rather than raised, so callers decide
+    whether a page that never became ready is an error. The wait stops with
+    BrowserWorkCancelled at the next poll once the run_blocking call is cancelled, and
+    is shortened to the call's deadline, raising DeadlineExceeded if that runs out.
+
+    Args:
+        driver: Selenium WebDriver instance
+        name (str): Condition name for the wait metrics
+        condition: Callable taking the driver, as for WebDriverWait.until
+        timeout (float): Maximum seconds to wait
+
+    Returns:
+        The condition's last value, or False on timeout
+    """
+    def poll(driver):
+        check_cancelled()
+        return condition(driver)
+
+    deadline = getattr(_browser_work, 'deadline', None)
+    if deadline is not None:
+        timeout = deadline.cap(timeout)
+    started_at = time.monotonic()
+    try:
+        result = WebDriverWait(driver, timeout, poll_frequency=WAIT_POLL_INTERVAL).until(poll)
+        timed_out = False
+    except TimeoutException:
+        logger.warning(f"Timed out after {timeout}s waiting for {name}")
+        result = False
+        timed_out = True
+    wait_metrics.record(name, time.monotonic() - started_at, timed_out)
+    if timed_out and deadline is not None:
+        deadline.check()
+    return result
+
+def search_page_ready(driver):
+    """Wait condition: the results container or a CAPTCHA form is on the page"""
+    return bool(driver.find_elements(By.CSS_SELECTOR, SEARCH_PAGE_READY_SELECTOR))
+
+def captcha_present(driver):
+    """Return True if the page is Amazon's CAPTCHA form rather than the requested page"""
+    return bool(driver.find_elements(By.CSS_SELECTOR, CAPTCHA_FORM_SELECTOR))
+
+def cards_settled(polls=CARD_SETTLE_POLLS):
+    """Build a wait condition that holds once result card count and page height stop changing
+
+    Returns:
+        A callable for wait_for; each instance tracks its own readings
+    """
+    readings = []
+    def condition(driver):
+        readings.append(tuple(driver.execute_script(
+            "return [document.querySelectorAll(arguments[0]).length, document.body.scrollHeight];",
+            SEARCH_RESULT_SELECTOR
+        )))
+        return len(readings) > polls and len(set(readings[-(polls + 1):])) == 1
+    return condition
+
+def _open_search_url(driver, search_term, page=None, sort=None):
+    """Load the results page for search_term directly, retrying on load errors"""
+    search_url = build_search_url(search_term, page=page, sort=sort)
+    max_retries = 3
+    for attempt in range(max_retries):
+        try:
+            navigate(driver, search_url)
+            wait_for(driver, 'search_page', search_page_ready)
+            # handle_captcha reads the whole page source, so only call it on the CAPTCHA form
+            if captcha_present(driver) and not handle_captcha(driver):
+                raise Exception("Failed to handle CAPTCHA")
+            if driver.find_elements(By.CSS_SELECTOR, "div.s-main-slot"):
+                logger.debug(f"Loaded search results: {search_url}")
+                return True
+            logger.warning(f"Attempt {attempt + 1}: No search results container, retrying...")
+        except (RateLimitExceeded, BrowserWorkCancelled):
+            raise
+        except Exception as e:
+            logger.warning(f"Attempt {attempt + 1}: Error loading search results: {str(e)}")
+        if attempt < max_retries - 1:
+            pause(random.uniform(3, 5))
+    logger.error("Failed to load search results after multiple attempts")
+    return False
+
+def _perform_amazon_search(driver, search_term, navigation='direct', page=None, sort=None):
+    """Blocking implementation of perform_amazon_search"""
+    if navigation == 'direct':
+        return _open_search_url(driver, search_term, page=page, sort=sort)
+    try:
+        # First perform the search with retry mechanism
+        max_retries = 3
+        for attempt in range(max_retries):
+            try:
+                # Navigate to Amazon
+                navigate(driver, AMAZON_URL)
+                wait_for(driver, 'homepage', lambda d: d.find_elements(By.ID, "twotabsearchtextbox"))
+                
+                # Try to find search box
+                try:
+                    search_box = driver.find_element(By.ID, "twotabsearchtextbox")
+                    if search_box:
+                        logger.debug("Found search box")
+                        break
+                except:
+                    logger.warning(f"Attempt {attempt + 1}: Could not find search box, refreshing page...")
+                    refresh_page(driver)
+                    pause(random.uniform(3, 5))
+                    continue
+                    
+            except (RateLimitExceeded, BrowserWorkCancelled):
+                raise
+            except Exception as e:
+                logger.warning(f"Attempt {attempt + 1}: Error accessing Amazon: {str(e)}")
+                if attempt < max_retries - 1:
+                    refresh_page(driver)
+                    pause(random.uniform(3, 5))
+                else:
+                    raise Exception("Failed to access Amazon after multiple attempts")
+        
+        # If we still don't have a search box after all retries, raise an error
+        try:
+            search_box = driver.find_element(By.ID, "twotabsearchtextbox")
+        except:
+            raise Exception("Could not find search box after multiple attempts")
+        
+        # Search for the term
+        human_like_typing(search_box, search_term)
+        # Submitting the search box loads the results page, so it spends a navigation token too
+        navigation_rate_limiter.acquire()
+        search_box.send_keys(Keys.RETURN)
+        wait_for(driver, 'search_page', search_page_ready)
+        
+        return True
+        
+    except (RateLimitExceeded, BrowserWorkCancelled):
+        raise
+    except Exception as e:
+        logger.error(f"Error performing search: {str(e)}")
+        return False
+
+async def perform_amazon_search(driver, search_term, navigation='direct', page=None, sort=None, deadline=None):
+    """Perform a search on Amazon with retry mechanism and CAPTCHA handling
+
+    Args:
+        driver: Selenium WebDriver instance
+        search_term (str): The search term to use
+        navigation (str): 'direct' to load the search results URL, or 'homepage' to
+            type the term into the homepage search box like a user would
+        page (int): Result page to open, 'direct' navigation only
+        sort (str): One of SEARCH_SORT_ORDERS, 'direct' navigation only
+        deadline (Deadline): Request budget for the retries and CAPTCHA handling
+
+    Returns:
+        bool: True if search was successful, False otherwise
+    """
+    return await run_blocking(_perform_amazon_search, driver, search_term, navigation, page, sort, deadline=deadline)
+
+@dataclass
+class ScrollState:
+    """Progress of a search through its result pages, carried between scroll passes"""
+    extraction_mode: str
+    parser: str
+    last_height: int = 0
+    found_count: int = 0
+    page_found_count: int = 0  # New products found on the current page
+    has_next_page: bool = False  # Set when a pass reaches the bottom of the page
+    seen_products: set = field(default_factory=set)  # product_key of every product found, across pages
+    seen_cards: set = field(default_factory=set)  # data-index/data-asin keys of cards already extracted on this page
+
+    def start_page(self, height):
+        """Reset the per-page progress for a newly loaded results page"""
+        self.last_height = height
+        self.page_found_count = 0
+        self.has_next_page = False
+        self.seen_cards.clear()
+
+def scrape_scroll_pass(driver, state):
+    """Scroll once and extract the new result cards
+
+    This blocks for several seconds, so async code runs it through run_blocking.
+
+    Args:
+        driver: Selenium WebDriver instance showing a search results page
+        state (ScrollState): Search progress, updated in place
+
+    Returns:
+        tuple: The new Product records found by this pass, and True once the bottom of
+            the page is reached. state.has_next_page then says whether another page follows.
+    """
+    # Scroll down
+    driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+    wait_for(driver, 'cards_settled', cards_settled())
+    
+    cards = None
+    if state.extraction_mode == 'script':
+        try:
+            cards = read_card_fields_in_browser(driver, state.seen_cards)
+        except Exception as e:
+            logger.warning(f"In-browser extraction failed, falling back to BeautifulSoup: {str(e)}")
+            state.extraction_mode = 'incremental'
+    
+    if state.extraction_mode == 'incremental':
+        # Only pull the cards that appeared since the previous pass
+        new_cards = driver.execute_script(NEW_CARDS_SCRIPT, list(state.seen_cards))
+        logger.debug(f"Found {len(new_cards)} new result cards")
+        cards = []
+        for key, rank, card_html in new_cards:
+            state.seen_cards.add(key)
+            for fields in read_cards_from_html(card_html, state.parser):
+                fields['rank'] = rank
+                cards.append(fields)
+    elif state.extraction_mode == 'full':
+        # Get current page source
+        cards = read_cards_from_html(driver.page_source, state.parser)
+    
+    # Process search results, skipping products we've already seen
+    batch = []
+    for result in build_search_results(cards):
+        key = product_key(result)
+        if key in state.seen_products:
+            continue
+        state.seen_products.add(key)
+        batch.append(result)
+    state.found_count += len(batch)
+    state.page_found_count += len(batch)
+    
+    # Check if we've reached the end of the page
+    new_height = driver.execute_script("return document.body.scrollHeight")
+    if new_height == state.last_height:
+        # An enabled "Next" button means there is another page to load by index
+        try:
+            next_button = driver.find_element(By.CSS_SELECTOR, '.s-pagination-next')
+            state.has_next_page = bool(next_button) and not next_button.get_attribute('aria-disabled')
+        except:
+            state.has_next_page = False
+        return batch, True
+    state.last_height = new_height
+    return batch, False
+
+def save_debug_page_source(driver):
+    """Save the current page source to debug_page_source.html"""
+    with open('debug_page_source.html', 'w', encoding='utf-8') as f:
+        f.write(driver.page_source)
+    logger.info("Saved page source to debug_page_source.html")
+
+def check_search_options(extraction_mode='script', parser='html.parser', navigation='direct',
+                         page=None, sort=None, max_pages=None, max_results=None):
+    """Raise ValueError for iter_search_result_batches options that would fail, before taking a browser"""
+    if extraction_mode not in EXTRACTION_MODES:
+        raise ValueError(f"extraction_mode must be one of {EXTRACTION_MODES}")
+    if parser not in PARSER_BACKENDS:
+        raise ValueError(f"parser must be one of {PARSER_BACKENDS}")
+    if navigation not in NAVIGATION_MODES:
+        raise ValueError(f"navigation must be one of {NAVIGATION_MODES}")
+    if navigation == 'homepage' and (page is not None or sort is not None):
+        raise ValueError("page and sort need 'direct' navigation")
+    build_search_url('', page=page, sort=sort)  # Validates page and sort
+    for name, limit in (('max_pages', max_pages), ('max_results', max_results)):
+        if limit is not None and limit < 1:
+            raise ValueError(f"{name} must be 1 or greater")
+
+async def iter_search_result_batches(search_term, extraction_mode='script', parser='html.parser',
+                                     navigation='direct', page=None, sort=None,
+                                     max_pages=None, max_results=None, deadline=None):
+    """Search Amazon and yield products as each scroll or page pass finds them
+
+    The browser work runs on the browser executor, so the event loop is free while the
+    search scrolls and paginates: fastserver.py keeps serving other requests, while the
+    MCP stdio server in server.py still handles one tool call at a time.
+
+    Args:
+        search_term (str): The search term to use
+        extraction_mode (str): 'script' to read the new result cards in the browser with one
+            script call per pass, 'incremental' to parse only the new cards with BeautifulSoup,
+            or 'full' to re-parse the whole page source on every pass. 'script' falls back to
+            'incremental' if the in-browser extraction fails.
+        parser (str): HTML parser backend for the BeautifulSoup extraction modes, one of
+            PARSER_BACKENDS
+        navigation (str): One of NAVIGATION_MODES, see perform_amazon_search
+        page (int): Result page to start from, 'direct' navigation only
+        sort (str): One of SEARCH_SORT_ORDERS, 'direct' navigation only
+        max_pages (int): Stop after this many result pages, or None for no limit
+        max_results (int): Stop once this many products are found, or None for no limit
+        deadline (Deadline): Time budget for the whole search, from waiting for a browser
+            to the last page, or None for no limit
+
+    Later pages are loaded by page index. The search also stops at the last page, or
+    after a page that adds no new products. When the deadline runs out the search stops
+    with the products found so far and sets deadline.exceeded.
+
+    Cancelling the task consuming the batches stops the browser work within one scroll
+    pass, wait or retry pause, and returns the browser to the pool.
+
+    Yields:
+        list: The new Product records found by one pass, in page order
+    """
+    check_search_options(extraction_mode, parser, navigation, page, sort, max_pages, max_results)
+    deadline = deadline or Deadline()
+
+    try:
+        deadline.check()
+        async with browser_session(deadline=deadline) as driver:
+            logger.info(f"Starting search for: {search_term}")
+            state = ScrollState(extraction_mode=extraction_mode, parser=parser)
+            try:
+                # Perform the search
+                if not await perform_amazon_search(driver, search_term, navigation, page, sort, deadline=deadline):
+                    raise Exception("Failed to perform search")
+                
+                page_number = page or 1
+                pages_loaded = 0
+                while True:
+                    # Scroll through the page to load all results
+                    state.start_page(await run_blocking(
+                        driver.execute_script, "return document.body.scrollHeight", deadline=deadline
+                    ))
+                    pages_loaded += 1
+                    finished = False
+                    while not finished:
+                        deadline.check()
+                        batch, finished = await run_blocking(scrape_scroll_pass, driver, state, deadline=deadline)
+                        if max_results is not None and state.found_count >= max_results:
+                            batch = batch[:len(batch) - (state.found_count - max_results)]
+                            state.found_count = max_results
+                        if batch:
+                            yield batch
+                        if state.found_count == max_results:
+                            logger.info(f"Reached max_results={max_results}")
+                            break
+                    
+                    if state.found_count == max_results:
+                        break
+                    if not state.has_next_page:
+                        break
+                    if max_pages is not None and pages_loaded >= max_pages:
+                        logger.info(f"Reached max_pages={max_pages}")
+                        break
+                    if not state.page_found_count:
+                        logger.info(f"Page {page_number} added no new products, stopping")
+                        break
+                    
+                    page_number += 1
+                    deadline.check()
+                    try:
+                        loaded = await run_blocking(
+                            _open_search_url, driver, search_term, page_number, sort, deadline=deadline
+                        )
+                    except RateLimitExceeded as e:
+                        logger.warning(f"{str(e)}, returning the results found so far")
+                        break
+                    if not loaded:
+                        logger.warning(f"Could not load page {page_number}, returning the results found so far")
+                        break
+            except DeadlineExceeded as e:
+                logger.warning(f"{str(e)}, returning the {state.found_count} results found so far")
+            
+            if not state.found_count and not deadline.exceeded:
+                logger.warning("No products found")
+                # Save the page source for debugging
+                await run_blocking(save_debug_page_source, driver)
+        
+    except DeadlineExceeded as e:
+        logger.warning(f"{str(e)} before a browser was free for: {search_term}")
+    except asyncio.CancelledError:
+        logger.info(f"Search for {search_term} cancelled, browser released")
+        raise
+    except Exception as e:
+        logger.error(f"Error in search: {str(e)}")
+        logger.error(f"Traceback: {traceback.format_exc()}")
+        raise
+
+async def search_amazon_products(search_term, on_progress=None, deadline=None, **options):
+    """Search Amazon and return structured results
+
+    Args:
+        search_term (str): The search term to use
+        on_progress: Optional async callable, awaited with the list of products found
+            so far after every pass that finds new products; it must not change the list
+        deadline (Deadline): Time budget for the search, or None for no limit
+        **options: Extra arguments for iter_search_result_batches
+
+    Returns:
+        SearchResults: The products found, in page order, marked truncated if the
+            deadline ran out first
+    """
+    started_at = time.perf_counter()
+    products = []
+    async for batch in iter_search_result_batches(search_term, deadline=deadline, **options):
+        products.extend(batch)
+        if on_progress:
+            await on_progress(products)
+    if startup_stats['first_request_seconds'] is None:
+        startup_stats['first_request_seconds'] = round(time.perf_counter() - started_at, 3)
+        logger.info(f"First search completed in {startup_stats['first_request_seconds']}s")
+    return SearchResults(
+        search_term=search_term,
+        products=products,
+        truncated=deadline is not None and deadline.exceeded
+    )
+
+async def get_amazon_search_results(search_term, **options):
+    """Search Amazon and return results
+
+    Args:
+        search_term (str): The search term to use
+        **options: Extra arguments for search_amazon_products
+
+    Returns:
+        tuple: Markdown formatted results and the number of products found
+    """
+    results = await search_amazon_products(search_term, **options)
+    return render_markdown(results.products), results.count
+
+class SearchResultCache:
+    """Size-bounded LRU cache of search results with a time-to-live
+
+    Entries are read and written from the event loop, so no locking is needed.
+    """
+
+    def __init__(self, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (stored_at, value), least recently used first
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, max_age=None):
+        """Return the cached value for key, or None if it is missing or older than max_age
+
+        Args:
+            key: Cache key from make_search_key
+            max_age (float): Maximum acceptable age in seconds, capped at the cache TTL
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        stored_at, value = entry
+        age = time.time() - stored_at
+        if age > self.ttl:
+            del self._entries[key]
+            self.misses += 1
+            return None
+        if max_age is not None and age > max_age:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def peek(self, key, max_age=None):
+        """Return True if get would return a value, without touching the LRU order or counters"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False
+        age = time.time() - entry[0]
+        return age <= self.ttl and (max_age is None or age <= max_age)
+
+    def set(self, key, value):
+        """Store value under key, evicting the least recently used entries when full"""
+        self._entries[key] = (time.time(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """Drop every cached entry"""
+        self._entries.clear()
+
+    def stats(self):
+        """Return cache size and hit/miss counters"""
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
+
+search_cache = SearchResultCache()
+
+def make_search_key(search_term, **options):
+    """Build a cache key from the normalized search term and search options"""
+    normalized_term = ' '.join(search_term.lower().split())
+    # Options left at None mean the default, so they share the key of omitting them
+    return (normalized_term, tuple(sorted((name, value) for name, value in options.items() if value is not None)))
+
+class SearchFlight:
+    """A search run shared by every caller that asks for the same key while it is in flight"""
+
+    def __init__(self):
+        self.task = None
+        self.waiters = 0  # Callers served by this run besides the one that started it
+        self.callers = 0  # Callers awaiting this run right now
+        self.listeners = []  # Progress callbacks of the callers awaiting this run
+
+    async def notify(self, products):
+        """Pass the products found so far to every listening caller"""
+        for listener in list(self.listeners):
+            try:
+                await listener(products)
+            except Exception as e:
+                logger.warning(f"Progress callback failed: {str(e)}")
+
+_inflight_searches = {}  # key -> SearchFlight
+single_flight_stats = {
+    'runs': 0,
+    'coalesced': 0,
+    'max_waiters': 0,
+    'cancelled': 0
+}
+
+def _finish_flight(key, flight):
+    """Unregister a finished search run and record how many waiters it served"""
+    if _inflight_searches.get(key) is flight:
+        del _inflight_searches[key]
+    single_flight_stats['runs'] += 1
+    single_flight_stats['coalesced'] += flight.waiters
+    single_flight_stats['max_waiters'] = max(single_flight_stats['max_waiters'], flight.waiters)
+    if flight.task.cancelled():
+        single_flight_stats['cancelled'] += 1
+        logger.info(f"Search run for {key[0]!r} cancelled, no callers left")
+        return
+    logger.info(f"Search run for {key[0]!r} finished, served {flight.waiters} waiting callers")
+    # Mark the exception as retrieved even if nobody is left awaiting the run
+    flight.task.exception()
+
+async def run_single_flight(key, coroutine_factory, on_progress=None):
+    """Run coroutine_factory(flight) once per key, sharing its result with concurrent callers
+
+    The first caller for a key starts the run in its own task. Callers arriving before it
+    finishes await the same task instead of starting another browser session. A caller
+    being cancelled does not cancel the shared run while other callers still await it;
+    once the last one is cancelled, the run is cancelled too and its browser released.
+
+    Args:
+        key: Search key from make_search_key
+        coroutine_factory: Callable taking the SearchFlight and returning the coroutine to run
+        on_progress: Optional async progress callback, see SearchFlight.notify
+
+    Returns:
+        The result of the shared run
+    """
+    flight = _inflight_searches.get(key)
+    if flight is None:
+        flight = SearchFlight()
+        flight.task = asyncio.ensure_future(coroutine_factory(flight))
+        _inflight_searches[key] = flight
+        flight.task.add_done_callback(lambda task: _finish_flight(key, flight))
+    else:
+        flight.waiters += 1
+        logger.info(f"Joining in-flight search for {key[0]!r} ({flight.waiters} waiting)")
+    
+    flight.callers += 1
+    if on_progress:
+        flight.listeners.append(on_progress)
+    try:
+        return await asyncio.shield(flight.task)
+    finally:
+        flight.callers -= 1
+        if on_progress:
+            flight.listeners.remove(on_progress)
+        if not flight.callers and not flight.task.done():
+            # Every caller has gone away, so nobody will read the results. Later callers
+            # for the key start a fresh run rather than join the one being cancelled.
+            if _inflight_searches.get(key) is flight:
+                del _inflight_searches[key]
+            flight.task.cancel()
+
+async def _search_and_cache(key, search_term, options, on_progress=None, deadline=None):
+    """Run a search and cache its results if they are complete and non-empty"""
+    results = await search_amazon_products(search_term, on_progress=on_progress, deadline=deadline, **options)
+    # Don't cache empty results, they usually mean a CAPTCHA or a failed page load,
+    # nor results a deadline cut short
+    if results.products and not results.truncated:
+        search_cache.set(key, results)
+    return results
+
+def get_search_stats():
+    """Return the search cache, single-flight and browser pool counters"""
+    return {
+        'cache': search_cache.stats(),
+        'single_flight': dict(single_flight_stats, in_flight=len(_inflight_searches)),
+        'browser_pool': driver_pool.stats(),
+        'startup': dict(startup_stats),
+        'waits': wait_metrics.stats(),
+        'batch_rate_limit': batch_rate_limiter.stats(),
+        'navigation_rate_limit': navigation_rate_limiter.stats()
+    }
+
+async def get_cached_search_results(search_term, max_age=None, force_refresh=False, on_progress=None,
+                                    deadline=None, **options):
+    """Return search results from the cache, running the search on a miss
+
+    Concurrent misses for the same key share one search run. A search with a deadline
+    runs on its own instead, since a run cut short at one caller's deadline cannot
+    serve callers with other deadlines.
+
+    Args:
+        search_term (str): The search term to use
+        max_age (float): Maximum acceptable age of cached results in seconds
+        force_refresh (bool): Skip the cache and always run a fresh search
+        on_progress: Optional async callable, awaited with the list of products found
+            so far while a search runs
+        deadline (Deadline): Time budget for a search run, or None for no limit
+        **options: Extra arguments for iter_search_result_batches, part of the cache key
+
+    Returns:
+        SearchResults: The products found, shared with other callers and the cache
+    """
+    key = make_search_key(search_term, **options)
+    if not force_refresh:
+        cached = search_cache.get(key, max_age)
+        if cached is not None:
+            logger.info(f"Cache hit for search: {search_term}")
+            return cached
+    
+    if deadline is not None and deadline.seconds is not None:
+        return await _search_and_cache(key, search_term, options, on_progress, deadline)
+    return await run_single_flight(
+        key,
+        lambda flight: _search_and_cache(key, search_term, options, flight.notify),
+        on_progress
+    )
+
+async def stream_search_results(search_term, max_age=None, force_refresh=False, deadline=None, **options):
+    """Yield batches of products as the search finds them, serving cached results if fresh
+
+    A live search stores its results in the cache once it completes.
+
+    Args:
+        search_term (str): The search term to use
+        max_age (float): Maximum acceptable age of cached results in seconds
+        force_refresh (bool): Skip the cache and always run a fresh search
+        deadline (Deadline): Time budget for a live search; deadline.exceeded tells
+            whether it stopped early
+        **options: Extra arguments for iter_search_result_batches, part of the cache key
+
+    Yields:
+        list: Product records, in page order
+    """
+    key = make_search_key(search_term, **options)
+    if not force_refresh:
+        cached = search_cache.get(key, max_age)
+        if cached is not None:
+            logger.info(f"Cache hit for streamed search: {search_term}")
+            yield cached.products
+            return
+    
+    products = []
+    async for batch in iter_search_result_batches(search_term, deadline=deadline, **options):
+        products.extend(batch)
+        yield batch
+    if products and not (deadline is not None and deadline.exceeded):
+        search_cache.set(key, SearchResults(search_term=search_term, products=products))
+
+async def search_amazon_batch(search_terms, concurrency=None, max_age=None, force_refresh=False,
+                              deadline=None, **options):
+    """Search for many terms, a bounded number at a time, under the shared batch rate limit
+
+    Terms that are the same after normalization are searched once and share the
+    outcome. Every search goes through get_cached_search_results, so cached terms cost
+    no browser run; only terms that need one take a token from batch_rate_limiter,
+    which all batches share.
+
+    Args:
+        search_terms (list): The search terms to use
+        concurrency (int): Maximum number of terms searched at once, default BATCH_CONCURRENCY,
+            never more than the browser pool size
+        max_age (float): Maximum acceptable age of cached results in seconds
+        force_refresh (bool): Skip the cache and always run fresh searches
+        deadline (Deadline): Time budget for the whole batch. Terms still waiting for a
+            turn when it runs out return empty results marked truncated.
+        **options: Extra arguments for iter_search_result_batches, applied to every term
+
+    Returns:
+        list: One dict per term, in input order, with the search_term and either its
+            results (SearchResults) or the error message of its failed search
+    """
+    concurrency = concurrency or BATCH_CONCURRENCY
+    if concurrency < 1:
+        raise ValueError("concurrency must be 1 or greater")
+    if concurrency > driver_pool.max_size:
+        # Terms past the pool size would only queue for a browser while holding a rate limit token
+        logger.info(f"Batch concurrency {concurrency} capped at the browser pool size {driver_pool.max_size}")
+        concurrency = driver_pool.max_size
+    check_search_options(**options)
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    # Terms that normalize to the same key are searched once. Single-flight would share
+    # their run too, but not under a deadline, where every search runs on its own.
+    keys = [make_search_key(search_term, **options) for search_term in search_terms]
+    unique_terms = {}  # key -> first term with that key
+    for search_term, key in zip(search_terms, keys):
+        unique_terms.setdefault(key, search_term)
+    
+    async def search_one(key, search_term):
+        async with semaphore:
+            try:
+                # Each term's truncated flag is its own, though they share one budget
+                term_deadline = deadline.fork() if deadline is not None else None
+                if force_refresh or not search_cache.peek(key, max_age):
+                    await batch_rate_limiter.acquire_async(term_deadline)
+                results = await get_cached_search_results(
+                    search_term, max_age=max_age, force_refresh=force_refresh, deadline=term_deadline, **options
+                )
+                return {'results': results, 'error': None}
+            except Exception as e:
+                logger.error(f"Batch search failed for {search_term}: {str(e)}")
+                return {'results': None, 'error': str(e)}
+    
+    logger.info(f"Starting batch search for {len(unique_terms)} distinct of {len(search_terms)} terms, "
+                f"{concurrency} at a time")
+    outcomes = await asyncio.gather(*(search_one(key, search_term) for key, search_term in unique_terms.items()))
+    by_key = dict(zip(unique_terms, outcomes))
+    return [dict(by_key[key], search_term=search_term) for search_term, key in zip(search_terms, keys)]
+
+def _add_top_sponsored_products_to_cart(driver, search_term, number_of_products):
+    """Blocking implementation of add_top_sponsored_products_to_cart"""
+    added_products = []  # List to store titles of successfully added products
+    try:
+        logger.info(f"Starting search for sponsored products: {search_term}")
+        
+        navigate(driver, build_search_url(search_term))
+        
+        # Wait for page to load
+        logger.info("Waiting for page to load...")
+        if not wait_for(driver, 'search_page', search_page_ready, timeout=15):
+            raise Exception("Search results page did not load")
+        logger.info("Page loaded successfully")
+        
+        # Check for captcha
+        if captcha_present(driver) and not handle_captcha(driver):
+            raise Exception("Failed to handle CAPTCHA")
+        
+        # Print the page title for debugging
+        logger.info(f"Page title: {driver.title}")
+        
+        # Find all sponsored products using the exact HTML structure
+        sponsored_selectors = [
+            'div[class*="a-section"][class*="a-spacing-small"][class*="puis-padding-left-small"][class*="puis-padding-right-small"]',  # Main sponsored container
+            'div[class*="puis-card-container"]'  # Card container
+        ]
+        
+        sponsored_products = []  # Store both product info and add to cart button
+        for selector in sponsored_selectors:
+            try:
+                elements = driver.find_elements(By.CSS_SELECTOR, selector)
+                logger.info(f"Found {len(elements)} elements with selector: {selector}")
+                
                 for element in elements:
                     try:
                         # Look for the "Sponsored" label with the exact class structure
@@ -709,19 +2694,42 @@ async def add_top_sponsored_products_to_cart(search_term, number_of_products):
                 added_products.append(product['title'])  # Add title to list of successfully added products
 
                 # Optional sleep to let Amazon process cart addition
-                time.sleep(2)
+                pause(2)
 
+            except BrowserWorkCancelled:
+                raise
             except Exception as e:
                 logger.error(f"Error adding product {index + 1}: {e}")
 
         return added_products  # Return list of successfully added product titles
 
+    except DeadlineExceeded as e:
+        logger.warning(f"{str(e)}, {len(added_products)} products were added to cart")
+        return added_products
     except Exception as e:
         logger.error(f"Error in add_top_sponsored_products_to_cart: {e}")
         raise
-    finally:
-        if driver:
-            cleanup_driver()
+
+async def add_top_sponsored_products_to_cart(search_term, number_of_products, deadline=None):
+    """Search for a term and add the top sponsored products to the cart
+
+    Args:
+        search_term (str): The search term to find sponsored products
+        number_of_products (int): Number of products to add to cart
+        deadline (Deadline): Time budget for the call; when it runs out the products
+            added so far are returned and deadline.exceeded is set
+
+    Returns:
+        list: Titles of the products that were added to cart
+    """
+    try:
+        async with browser_session(deadline=deadline) as driver:
+            return await run_blocking(
+                _add_top_sponsored_products_to_cart, driver, search_term, number_of_products, deadline=deadline
+            )
+    except DeadlineExceeded as e:
+        logger.warning(f"{str(e)} before a browser was free, no products were added to cart")
+        return []
 
 def save_to_markdown(content, filename):
     """Save content to a markdown file"""
@@ -749,10 +2757,65 @@ async def main():
         logger.error(f"Error in main: {str(e)}")
         logger.error(f"Traceback: {traceback.format_exc()}")
 
+def _add_products_to_cart_by_asin(driver, asin_list):
+    """Add the products with the given ASINs on the current results page to the cart
+
+    Args:
+        driver: Selenium WebDriver instance showing a search results page
+        asin_list: List of ASINs to add to cart
+
+    Returns:
+        A list of dictionaries containing information about the products that were added to cart
+    """
+    added_products = []  # List to store products that were added to cart
+    
+    # Find and add each product to cart
+    for asin in asin_list:
+        try:
+            # Find the product element by ASIN
+            product_element = driver.find_element(By.CSS_SELECTOR, f'div[data-asin="{asin}"]')
+            if not product_element:
+                logger.warning(f"Product with ASIN {asin} not found")
+                continue
+                
+            # Get product title
+            title_element = product_element.find_element(By.CSS_SELECTOR, 'h2 span')
+            product_title = title_element.text if title_element else "Unknown Product"
+            
+            # Get product link
+            link_element = product_element.find_element(By.CSS_SELECTOR, 'a.a-link-normal')
+            product_link = link_element.get_attribute('href') if link_element else None
+            
+            # Find and click Add to Cart button
+            add_to_cart_button = product_element.find_element(By.CSS_SELECTOR, 'button[name="submit.addToCart"]')
+            if add_to_cart_button:
+                driver.execute_script("arguments[0].click();", add_to_cart_button)
+                logger.info(f"Added product to cart: {product_title}")
+                
+                # Add product info to the list
+                added_products.append({
+                    'title': product_title,
+                    'link': product_link,
+                    'asin': asin
+                })
+                
+                # Optional sleep to let Amazon process cart addition
+                pause(2)
+            else:
+                logger.warning(f"Add to Cart button not found for product: {product_title}")
+                
+        except BrowserWorkCancelled:
+            raise
+        except Exception as e:
+            logger.warning(f"Error adding product {asin} to cart: {e}")
+            continue
+    
+    return added_products
+
 async def add_sponsored_products_to_cart(asin_list, search_term="sponsored products"):
     """
     Add specific products to cart by their ASINs from search results page.
-    If no valid session exists, performs a search first.
+    If the browser is not showing search results, performs a search first.
     
     Args:
         asin_list: List of ASINs to add to cart
@@ -763,63 +2826,16 @@ async def add_sponsored_products_to_cart(asin_list, search_term="sponsored produ
     """
     try:
         logger.info(f"Processing add to cart request for {len(asin_list)} products")
-        added_products = []  # List to store products that were added to cart
         
-        # Check if we have a valid session, if not perform a search first
-        try:
-            # Get the current driver
-            driver = get_current_driver()
-            if not driver:
-                raise Exception("No valid search session found")
-                
-            # Find and add each product to cart
-            for asin in asin_list:
-                try:
-                    # Find the product element by ASIN
-                    product_element = driver.find_element(By.CSS_SELECTOR, f'div[data-asin="{asin}"]')
-                    if not product_element:
-                        logger.warning(f"Product with ASIN {asin} not found")
-                        continue
-                        
-                    # Get product title
-                    title_element = product_element.find_element(By.CSS_SELECTOR, 'h2 span')
-                    product_title = title_element.text if title_element else "Unknown Product"
-                    
-                    # Get product link
-                    link_element = product_element.find_element(By.CSS_SELECTOR, 'a.a-link-normal')
-                    product_link = link_element.get_attribute('href') if link_element else None
-                    
-                    # Find and click Add to Cart button
-                    add_to_cart_button = product_element.find_element(By.CSS_SELECTOR, 'button[name="submit.addToCart"]')
-                    if add_to_cart_button:
-                        driver.execute_script("arguments[0].click();", add_to_cart_button)
-                        logger.info(f"Added product to cart: {product_title}")
-                        
-                        # Add product info to the list
-                        added_products.append({
-                            'title': product_title,
-                            'link': product_link,
-                            'asin': asin
-                        })
-                        
-                        # Optional sleep to let Amazon process cart addition
-                        time.sleep(2)
-                    else:
-                        logger.warning(f"Add to Cart button not found for product: {product_title}")
-                        
-                except Exception as e:
-                    logger.warning(f"Error adding product {asin} to cart: {e}")
-                    continue
-                    
-        except Exception as e:
-            if "No valid search session found" in str(e):
-                logger.info("No valid session found, performing search first...")
-                # Perform a search to establish a valid session
-                await get_amazon_search_results(search_term)
-                # Try adding to cart again
-                return await add_sponsored_products_to_cart(asin_list, search_term)
-            else:
-                raise
+        async with browser_session() as driver:
+            # Make sure this browser is showing search results before looking for the products
+            current_url = await run_blocking(lambda: driver.current_url)
+            if '/s?' not in current_url:
+                logger.info("Browser is not on a search results page, performing search first...")
+                if not await perform_amazon_search(driver, search_term):
+                    raise Exception("Failed to perform search")
+            
+            added_products = await run_blocking(_add_products_to_cart_by_asin, driver, asin_list)
                 
         return added_products  # Return list of products that were added to cart
 
@@ -1,11 +1,33 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
+from datetime import datetime
+import asyncio
+import json
 import logging
+import os
 import sys
+import time
+import uuid
 from amazon_scraper import (
-    get_amazon_search_results,
-    add_top_sponsored_products_to_cart
+    get_cached_search_results,
+    get_search_stats,
+    render_markdown,
+    render_results,
+    check_result_options,
+    check_search_options,
+    filter_products,
+    refine_results,
+    stream_search_results,
+    search_amazon_batch,
+    add_top_sponsored_products_to_cart,
+    warm_start,
+    Deadline,
+    RateLimitExceeded,
+    Product as ProductRecord,
+    SearchResults,
+    WARM_START_BROWSERS
 )
 
 # Configure logging
@@ -18,6 +40,23 @@ logging.basicConfig(
 )
 logger = logging.getLogger('amazon_scraper')
 
+# Compact output formats are returned as the raw rendered text
+TEXT_OUTPUT_MEDIA_TYPES = {
+    "jsonl": "application/x-ndjson",
+    "csv": "text/csv",
+    "tsv": "text/tab-separated-values"
+}
+
+# Search jobs: results are written to JOBS_DIR as JSON so they survive restarts
+JOBS_DIR = os.getenv('SEARCH_JOBS_DIR', 'search_jobs')
+JOB_WORKERS = int(os.getenv('SEARCH_JOB_WORKERS', '2'))
+JOB_TTL = int(os.getenv('SEARCH_JOB_TTL', str(24 * 60 * 60)))  # Seconds a finished job is kept
+JOB_FINAL_STATES = ('done', 'failed', 'cancelled')
+JOB_RETRY_STATES = ('failed', 'cancelled')  # A new identical request replaces a job in these states
+
+# Seconds between checks for a client that went away during a search
+DISCONNECT_POLL_INTERVAL = float(os.getenv('DISCONNECT_POLL_INTERVAL', '0.5'))
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Amazon Scraper API",
@@ -25,23 +64,372 @@ app = FastAPI(
     version="1.0.0"
 )
 
+@app.on_event("startup")
+async def warm_browsers():
+    """Launch browsers before uvicorn starts accepting requests, if WARM_START_BROWSERS is set"""
+    if WARM_START_BROWSERS > 0:
+        await asyncio.get_running_loop().run_in_executor(None, warm_start, WARM_START_BROWSERS)
+
 # Define request models
-class SearchRequest(BaseModel):
+class SearchOptions(BaseModel):
+    max_age: Optional[int] = None
+    force_refresh: bool = False
+    output_format: str = "markdown"
+    sort: Optional[str] = None
+    page: Optional[int] = None
+    max_pages: Optional[int] = None
+    max_results: Optional[int] = None
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    min_reviews: Optional[int] = None
+    sponsored: str = "include"
+    order_by: Optional[str] = None
+    fields: Optional[List[str]] = None
+    deadline: Optional[float] = None  # Seconds before returning the results found so far
+
+class SearchRequest(SearchOptions):
     search_term: str
 
+class BatchSearchRequest(SearchOptions):
+    search_terms: List[str]
+    concurrency: Optional[int] = None
+
 class AddToCartRequest(BaseModel):
     search_term: str
     number_of_products: int = 4
+    deadline: Optional[float] = None
 
 # Define response models
+# Every field is optional so a request's field list can leave fields out of the response
+class Product(BaseModel):
+    title: Optional[str] = None
+    price: Optional[float] = None
+    price_text: Optional[str] = None
+    num_reviews: Optional[int] = None
+    sponsored: Optional[bool] = None
+    asin: Optional[str] = None
+    rank: Optional[str] = None
+    link: Optional[str] = None
+    currency: Optional[str] = None
+    star_rating: Optional[float] = None
+    repeat_buyers: Optional[int] = None
+
 class SearchResponse(BaseModel):
-    results: str
+    results: Optional[str] = None
+    count: int
+    truncated: bool = False
+    products: List[Product]
+
+class BatchSearchItem(BaseModel):
+    search_term: str
+    count: Optional[int] = None
+    truncated: Optional[bool] = None
+    results: Optional[str] = None
+    products: Optional[List[Product]] = None
+    error: Optional[str] = None
+
+class BatchSearchResponse(BaseModel):
+    failed: int
+    results: List[BatchSearchItem]
+
+class JobResponse(BaseModel):
+    id: str
+    status: str
+    search_term: str
     count: int
+    truncated: bool = False
+    results: Optional[str] = None
+    products: Optional[List[Product]] = None
+    error: Optional[str] = None
+    created_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
 
 class AddToCartResponse(BaseModel):
     status: str
     message: str
     products: List[str]
+    truncated: bool = False
+
+class SearchJobQueue:
+    """In-process queue of search jobs, with each job's state persisted as JSON
+
+    A job is one SearchRequest. Posting a request identical to a queued, running or
+    finished job returns that job instead of starting a new one, so client retries
+    never repeat browser work. Jobs run through get_cached_search_results, so jobs that
+    differ only in output format, filters, order or fields, and /search calls for the
+    same term, share one browser run. Products are saved as each page pass finds them,
+    so a running job already has partial results.
+    """
+
+    def __init__(self, jobs_dir=JOBS_DIR, workers=JOB_WORKERS, ttl=JOB_TTL):
+        self.jobs_dir = jobs_dir
+        self.workers = workers
+        self.ttl = ttl
+        self.jobs = {}  # job id -> job dict, as saved to disk
+        self._job_ids = {}  # request key -> id of the job serving it
+        self._running = {}  # job id -> task running its search
+        self._queue = None
+        self._worker_tasks = []
+
+    async def start(self):
+        """Load saved jobs, re-queue the ones a restart interrupted, and start the workers"""
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        self._queue = asyncio.Queue()
+        for filename in sorted(os.listdir(self.jobs_dir)):
+            if not filename.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.jobs_dir, filename), encoding='utf-8') as f:
+                    job = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping unreadable job file {filename}: {str(e)}")
+                continue
+            self.jobs[job['id']] = job
+            # Several saved jobs can share a key once one failed and was resubmitted;
+            # identical requests go to the one that did not fail, else the newest
+            current = self.jobs.get(self._job_ids.get(job['key']))
+            if current is None or self._job_preference(job) > self._job_preference(current):
+                self._job_ids[job['key']] = job['id']
+            if job['status'] not in JOB_FINAL_STATES:
+                job['status'] = 'queued'
+                self._queue.put_nowait(job['id'])
+        self.prune()
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info(f"Search job queue started with {self.workers} workers, {len(self.jobs)} saved jobs")
+
+    async def stop(self):
+        """Stop the workers and running searches; unfinished jobs stay saved and resume on the next start"""
+        tasks = self._worker_tasks + list(self._running.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def submit(self, request):
+        """Queue a search job for request, or return the job already serving it
+
+        Returns:
+            dict: The job
+        """
+        key = self._request_key(request)
+        job_id = self._job_ids.get(key)
+        if job_id in self.jobs and self.jobs[job_id]['status'] not in JOB_RETRY_STATES:
+            logger.info(f"Returning existing job {job_id} for: {request.search_term}")
+            return self.jobs[job_id]
+        
+        self.prune()
+        job = {
+            'id': uuid.uuid4().hex,
+            'key': key,
+            'status': 'queued',
+            'request': request.model_dump(),
+            'products': [],
+            'truncated': False,
+            'error': None,
+            'created_at': datetime.now().isoformat(),
+            'started_at': None,
+            'finished_at': None
+        }
+        self.jobs[job['id']] = job
+        self._job_ids[key] = job['id']
+        self._save(job)
+        self._queue.put_nowait(job['id'])
+        logger.info(f"Queued job {job['id']} for: {request.search_term}")
+        return job
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job
+
+        Returns:
+            dict: The job, now cancelled unless it had already finished
+        """
+        job = self.jobs[job_id]
+        if job['status'] in JOB_FINAL_STATES:
+            return job
+        self._finish(job, 'cancelled')
+        task = self._running.get(job_id)
+        if task:
+            task.cancel()
+        logger.info(f"Cancelled job {job_id}")
+        return job
+
+    def delete(self, job_id):
+        """Forget a finished job and remove its saved file"""
+        job = self.jobs.pop(job_id)
+        if self._job_ids.get(job['key']) == job_id:
+            del self._job_ids[job['key']]
+        try:
+            os.remove(self._path(job_id))
+        except OSError:
+            pass
+
+    def prune(self):
+        """Delete finished jobs older than the TTL"""
+        cutoff = time.time() - self.ttl
+        for job_id, job in list(self.jobs.items()):
+            if job['status'] in JOB_FINAL_STATES and datetime.fromisoformat(job['finished_at']).timestamp() < cutoff:
+                self.delete(job_id)
+
+    def stats(self):
+        """Return job counts by status and the queue length"""
+        counts = {}
+        for job in self.jobs.values():
+            counts[job['status']] = counts.get(job['status'], 0) + 1
+        return {
+            'workers': self.workers,
+            'queued': self._queue.qsize() if self._queue else 0,
+            'jobs': counts
+        }
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            job = self.jobs.get(job_id)
+            if job is None or job['status'] != 'queued':
+                continue  # Cancelled or deleted while waiting
+            task = asyncio.create_task(self._run(job))
+            self._running[job_id] = task
+            try:
+                await asyncio.wait([task])
+            finally:
+                self._running.pop(job_id, None)
+
+    async def _run(self, job):
+        request = SearchRequest(**job['request'])
+        job['status'] = 'running'
+        job['started_at'] = datetime.now().isoformat()
+        job['products'] = []
+        self._save(job)
+        
+        async def save_progress(products):
+            job['products'] = [product.to_dict() for product in products]
+            self._save(job)
+        
+        try:
+            # The search shares the cache and in-flight runs with /search and the other jobs;
+            # output options only shape the job's response, so they stay out of the search key.
+            # The deadline counts from when the job starts running, not from when it was queued.
+            results = await get_cached_search_results(
+                request.search_term,
+                max_age=request.max_age,
+                force_refresh=request.force_refresh,
+                on_progress=save_progress,
+                deadline=Deadline(request.deadline),
+                sort=request.sort,
+                page=request.page,
+                max_pages=request.max_pages,
+                max_results=request.max_results
+            )
+            job['products'] = [product.to_dict() for product in results.products]
+            job['truncated'] = results.truncated
+            self._finish(job, 'done')
+        except asyncio.CancelledError:
+            logger.info(f"Job {job['id']} stopped")
+        except Exception as e:
+            logger.error(f"Job {job['id']} failed: {str(e)}")
+            self._finish(job, 'failed', str(e))
+
+    def _finish(self, job, status, error=None):
+        job['status'] = status
+        job['error'] = error
+        job['finished_at'] = datetime.now().isoformat()
+        self._save(job)
+
+    def _job_preference(self, job):
+        return (job['status'] not in JOB_RETRY_STATES, job['created_at'])
+
+    def _request_key(self, request):
+        options = request.model_dump()
+        options['search_term'] = ' '.join(request.search_term.lower().split())
+        return json.dumps(options, sort_keys=True)
+
+    def _path(self, job_id):
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def _save(self, job):
+        # Write then rename, so a crash never leaves a half-written job file
+        path = self._path(job['id'])
+        with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump(job, f)
+        os.replace(f"{path}.tmp", path)
+
+job_queue = SearchJobQueue()
+
+@app.on_event("startup")
+async def start_job_queue():
+    """Start the search job workers"""
+    await job_queue.start()
+
+@app.on_event("shutdown")
+async def stop_job_queue():
+    """Stop the search job workers"""
+    await job_queue.stop()
+
+def job_response(job):
+    """Build the JobResponse for a job, applying its request's filters, order and fields"""
+    request = SearchRequest(**job['request'])
+    results = refine_results(
+        SearchResults(
+            search_term=request.search_term,
+            products=[ProductRecord(**product) for product in job['products']],
+            truncated=job.get('truncated', False)
+        ),
+        min_price=request.min_price,
+        max_price=request.max_price,
+        min_reviews=request.min_reviews,
+        sponsored=request.sponsored,
+        order_by=request.order_by
+    )
+    rendered = {}
+    if request.output_format in ("markdown", "json"):
+        rendered['products'] = [product.to_dict(request.fields) for product in results.products]
+    if request.output_format != "json":
+        rendered['results'] = render_results(results, request.output_format, request.fields)
+    return JobResponse(
+        id=job['id'],
+        status=job['status'],
+        search_term=request.search_term,
+        count=results.count,
+        truncated=results.truncated,
+        error=job['error'],
+        created_at=job['created_at'],
+        started_at=job['started_at'],
+        finished_at=job['finished_at'],
+        **rendered
+    )
+
+async def until_disconnected(http_request, awaitable):
+    """Await awaitable, cancelling it if the HTTP client disconnects first
+
+    Cancelling a search stops its browser work at the next wait, retry or page load and
+    returns the browser to the pool, unless another caller is still waiting on the
+    same search.
+
+    Args:
+        http_request: The Request of the endpoint serving the client
+        awaitable: The search to run
+
+    Returns:
+        The result of awaitable
+
+    Raises:
+        HTTPException: 499 if the client disconnected before the search finished
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait([task], timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await http_request.is_disconnected():
+                logger.info(f"Client disconnected from {http_request.url.path}, cancelling its search")
+                task.cancel()
+                await asyncio.wait([task])
+                raise HTTPException(status_code=499, detail="Client closed request")
+    finally:
+        # Also stop the search if this endpoint is itself cancelled
+        if not task.done():
+            task.cancel()
 
 @app.get("/")
 async def root():
@@ -51,59 +439,314 @@ async def root():
         "version": "1.0.0",
         "endpoints": [
             "/search",
-            "/add-to-cart"
+            "/search/stream",
+            "/search/batch",
+            "/jobs",
+            "/add-to-cart",
+            "/stats"
         ]
     }
 
-@app.post("/search", response_model=SearchResponse)
-async def search(request: SearchRequest):
+@app.get("/stats")
+async def stats():
+    """Return search cache, in-flight search and job queue counters"""
+    return {**get_search_stats(), 'jobs': job_queue.stats()}
+
+@app.post("/search", response_model=SearchResponse, response_model_exclude_unset=True)
+async def search(request: SearchRequest, http_request: Request):
     """
     Search Amazon for products
     
+    The search is cancelled if the client disconnects before it completes.
+    
     Args:
-        request: SearchRequest containing the search term
+        request: SearchRequest containing the search term, cache options, and the
+            filters, order and fields applied to the returned products
+        http_request: The underlying HTTP request, watched for a client disconnect
         
     Returns:
-        SearchResponse containing the search results and count
+        SearchResponse containing the product records, count, and for the "markdown"
+        output format the rendered markdown results. The "jsonl", "csv" and "tsv"
+        formats return just the rendered text, with a matching content type. If the
+        request's deadline ran out first, these are the results found so far, marked
+        by truncated, or for the text formats an X-Results-Truncated: true header.
     """
+    try:
+        check_result_options(request.sponsored, request.order_by, request.fields, request.output_format)
+    except ValueError as ve:
+        raise HTTPException(status_code=422, detail=str(ve))
     try:
         logger.info(f"Processing search request for: {request.search_term}")
-        results, count = await get_amazon_search_results(request.search_term)
-        return SearchResponse(results=results, count=count)
+        results = await until_disconnected(http_request, get_cached_search_results(
+            request.search_term,
+            max_age=request.max_age,
+            force_refresh=request.force_refresh,
+            deadline=Deadline(request.deadline),
+            sort=request.sort,
+            page=request.page,
+            max_pages=request.max_pages,
+            max_results=request.max_results
+        ))
+        results = refine_results(
+            results,
+            min_price=request.min_price,
+            max_price=request.max_price,
+            min_reviews=request.min_reviews,
+            sponsored=request.sponsored,
+            order_by=request.order_by
+        )
+        if request.output_format in TEXT_OUTPUT_MEDIA_TYPES:
+            return Response(
+                content=render_results(results, request.output_format, request.fields),
+                media_type=TEXT_OUTPUT_MEDIA_TYPES[request.output_format],
+                headers={"X-Results-Truncated": "true"} if results.truncated else None
+            )
+        return SearchResponse(
+            results=render_markdown(results.products, request.fields) if request.output_format == "markdown" else None,
+            count=results.count,
+            truncated=results.truncated,
+            products=[product.to_dict(request.fields) for product in results.products]
+        )
+    except ValueError as ve:
+        raise HTTPException(status_code=422, detail=str(ve))
+    except RateLimitExceeded as rle:
+        raise HTTPException(status_code=429, detail=str(rle))
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error processing search: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/jobs", response_model=JobResponse, response_model_exclude_unset=True, status_code=202)
+async def create_job(request: SearchRequest):
+    """
+    Queue a search and return its job at once, without waiting for the scrape
+    
+    Posting the same request again returns the existing job, unless that job failed
+    or was cancelled.
+    
+    Args:
+        request: SearchRequest, with the same options as /search
+        
+    Returns:
+        JobResponse with the job id to poll at /jobs/{id}
+    """
+    try:
+        check_result_options(request.sponsored, request.order_by, request.fields, request.output_format)
+        check_search_options(
+            page=request.page,
+            sort=request.sort,
+            max_pages=request.max_pages,
+            max_results=request.max_results
+        )
+        Deadline(request.deadline)  # Validates the deadline now, the job's budget starts when it runs
+    except ValueError as ve:
+        raise HTTPException(status_code=422, detail=str(ve))
+    return job_response(job_queue.submit(request))
+
+@app.get("/jobs/{job_id}", response_model=JobResponse, response_model_exclude_unset=True)
+async def get_job(job_id: str):
+    """
+    Return a job's status and its results so far
+    
+    While the job runs, the results hold the products found by the pages scraped so far.
+    
+    Args:
+        job_id: Id returned by POST /jobs
+        
+    Returns:
+        JobResponse with the status, timestamps and results in the request's output format
+    """
+    if job_id not in job_queue.jobs:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_response(job_queue.jobs[job_id])
+
+@app.delete("/jobs/{job_id}", response_model=JobResponse, response_model_exclude_unset=True)
+async def delete_job(job_id: str):
+    """
+    Cancel a queued or running job, or delete a finished one
+    
+    A cancelled job keeps the results found before it was cancelled until it is
+    deleted or expires.
+    
+    Args:
+        job_id: Id returned by POST /jobs
+        
+    Returns:
+        JobResponse with the job's final state
+    """
+    if job_id not in job_queue.jobs:
+        raise HTTPException(status_code=404, detail="Job not found")
+    job = job_queue.jobs[job_id]
+    if job['status'] in JOB_FINAL_STATES:
+        job_queue.delete(job_id)
+        return job_response(job)
+    return job_response(job_queue.cancel(job_id))
+
+@app.post("/search/batch", response_model=BatchSearchResponse, response_model_exclude_unset=True)
+async def search_batch(request: BatchSearchRequest, http_request: Request):
+    """
+    Search Amazon for many terms in one request
+    
+    Terms are searched a few at a time over the browser pool under one shared rate
+    limit. A failed term does not fail the request; its item carries the error instead.
+    The remaining searches are cancelled if the client disconnects. A deadline covers
+    the whole batch, and terms it cut short are marked truncated.
+    
+    Args:
+        request: BatchSearchRequest containing the search terms and the options of /search,
+            applied to every term
+        http_request: The underlying HTTP request, watched for a client disconnect
+        
+    Returns:
+        BatchSearchResponse with one item per term, in request order. JSON output fills
+        products; every other format fills results with the rendered text.
+    """
+    if not request.search_terms:
+        raise HTTPException(status_code=422, detail="search_terms must be a non-empty list")
+    try:
+        check_result_options(request.sponsored, request.order_by, request.fields, request.output_format)
+        logger.info(f"Processing batch search request for {len(request.search_terms)} terms")
+        outcomes = await until_disconnected(http_request, search_amazon_batch(
+            request.search_terms,
+            concurrency=request.concurrency,
+            max_age=request.max_age,
+            force_refresh=request.force_refresh,
+            deadline=Deadline(request.deadline),
+            sort=request.sort,
+            page=request.page,
+            max_pages=request.max_pages,
+            max_results=request.max_results
+        ))
+    except ValueError as ve:
+        raise HTTPException(status_code=422, detail=str(ve))
+    
+    items = []
+    for outcome in outcomes:
+        if outcome['error'] is not None:
+            items.append(BatchSearchItem(search_term=outcome['search_term'], error=outcome['error']))
+            continue
+        results = refine_results(
+            outcome['results'],
+            min_price=request.min_price,
+            max_price=request.max_price,
+            min_reviews=request.min_reviews,
+            sponsored=request.sponsored,
+            order_by=request.order_by
+        )
+        if request.output_format == "json":
+            items.append(BatchSearchItem(
+                search_term=outcome['search_term'],
+                count=results.count,
+                truncated=results.truncated,
+                products=[product.to_dict(request.fields) for product in results.products]
+            ))
+        else:
+            items.append(BatchSearchItem(
+                search_term=outcome['search_term'],
+                count=results.count,
+                truncated=results.truncated,
+                results=render_results(results, request.output_format, request.fields)
+            ))
+    return BatchSearchResponse(failed=sum(1 for item in items if item.error is not None), results=items)
+
+@app.post("/search/stream")
+async def search_stream(request: SearchRequest):
+    """
+    Search Amazon for products, streaming them as newline-delimited JSON
+    
+    Each product is sent as one JSON line as soon as the page pass that found it
+    completes. The last line is {"done": true, "count": N, "truncated": false}, or
+    {"error": "..."} if the search failed part way through. Filters and fields apply as for /search;
+    order_by is rejected because products are sent before the full set is known.
+    A client disconnect cancels the stream, which stops the search.
+    
+    Args:
+        request: SearchRequest containing the search term and cache options
+        
+    Returns:
+        StreamingResponse of application/x-ndjson lines
+    """
+    if request.order_by is not None:
+        raise HTTPException(status_code=422, detail="order_by is not supported for streamed results")
+    try:
+        check_result_options(request.sponsored, fields=request.fields)
+        # Checked before streaming starts, since errors after the 200 can only be sent as a line
+        check_search_options(
+            page=request.page,
+            sort=request.sort,
+            max_pages=request.max_pages,
+            max_results=request.max_results
+        )
+        deadline = Deadline(request.deadline)
+    except ValueError as ve:
+        raise HTTPException(status_code=422, detail=str(ve))
+    
+    async def generate():
+        count = 0
+        try:
+            async for batch in stream_search_results(
+                request.search_term,
+                max_age=request.max_age,
+                force_refresh=request.force_refresh,
+                deadline=deadline,
+                sort=request.sort,
+                page=request.page,
+                max_pages=request.max_pages,
+                max_results=request.max_results
+            ):
+                batch = filter_products(batch, request.min_price, request.max_price, request.min_reviews, request.sponsored)
+                count += len(batch)
+                yield "".join(json.dumps(product.to_dict(request.fields)) + "\n" for product in batch)
+            yield json.dumps({"done": True, "count": count, "truncated": deadline.exceeded}) + "\n"
+        except Exception as e:
+            logger.error(f"Error streaming search: {str(e)}")
+            yield json.dumps({"error": str(e), "count": count}) + "\n"
+    
+    logger.info(f"Processing streaming search request for: {request.search_term}")
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
 @app.post("/add-to-cart", response_model=AddToCartResponse)
 async def add_to_cart(request: AddToCartRequest):
     """
     Add sponsored products to cart
     
     Args:
-        request: AddToCartRequest containing search term and number of products
+        request: AddToCartRequest containing search term, number of products and an
+            optional deadline in seconds
         
     Returns:
-        AddToCartResponse containing status, message, and list of added product titles
+        AddToCartResponse containing status, message, and list of added product titles,
+        marked truncated if the deadline ran out before every product was added
     """
+    try:
+        deadline = Deadline(request.deadline)
+    except ValueError as ve:
+        raise HTTPException(status_code=422, detail=str(ve))
     try:
         logger.info(f"Processing add to cart request for {request.number_of_products} products")
         added_products = await add_top_sponsored_products_to_cart(
             request.search_term,
-            request.number_of_products
+            request.number_of_products,
+            deadline=deadline
         )
         
         if added_products:
             return AddToCartResponse(
                 status="success",
                 message=f"Successfully added {len(added_products)} products to cart",
-                products=added_products
+                products=added_products,
+                truncated=deadline.exceeded
             )
         else:
             return AddToCartResponse(
                 status="warning",
                 message="No products were added to cart",
-                products=[]
+                products=[],
+                truncated=deadline.exceeded
             )
+    except RateLimitExceeded as rle:
+        raise HTTPException(status_code=429, detail=str(rle))
     except Exception as e:
         logger.error(f"Error adding products to cart: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,20 +1,11 @@
 import sys
 import logging
-from mcp.server.fastmcp import FastMCP
-from amazon_scraper import (
-    get_amazon_search_results,
-    add_sponsored_products_to_cart,
-    cleanup_driver,
-    setup_driver,
-    handle_captcha,
-    add_top_sponsored_products_to_cart
-)
+from mcp.server.fastmcp import FastMCP, Context
+from typing import List, Optional
+import os
 import traceback
 import atexit
 import time
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.common.by import By
 
 # Configure logging - set to INFO level and simplify format
 logging.basicConfig(
@@ -28,43 +19,204 @@ logger = logging.getLogger('amazon_scraper')
 
 # Initialize MCP server
 logger.info("Initializing MCP server...")
+# mcp 1.2.0 awaits each request's handler before reading the next message, so this
+# server handles one tool call at a time even though the browser work runs off the
+# event loop; concurrent searches need fastserver.py or search_amazon_batch
 mcp = FastMCP("amazon_scraper")
 
-# Register cleanup on exit
-atexit.register(cleanup_driver)
+# amazon_scraper pulls in selenium, webdriver_manager and BeautifulSoup, so it is
+# imported on the first tool call rather than before the MCP handshake
+scraper = None
+
+def load_scraper():
+    """Import amazon_scraper on first use and register browser cleanup on exit"""
+    global scraper
+    if scraper is None:
+        started_at = time.perf_counter()
+        import amazon_scraper
+        atexit.register(amazon_scraper.cleanup_driver)
+        scraper = amazon_scraper
+        logger.info(f"Loaded amazon_scraper in {time.perf_counter() - started_at:.2f}s")
+    return scraper
 
 @mcp.tool()
-async def search_amazon(search_term: str) -> str:
+async def search_amazon(
+    search_term: str,
+    max_age: Optional[int] = None,
+    force_refresh: bool = False,
+    output_format: str = "markdown",
+    sort: Optional[str] = None,
+    page: Optional[int] = None,
+    max_pages: Optional[int] = None,
+    max_results: Optional[int] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    min_reviews: Optional[int] = None,
+    sponsored: str = "include",
+    order_by: Optional[str] = None,
+    fields: Optional[List[str]] = None,
+    deadline: Optional[float] = None,
+    ctx: Context = None
+) -> str:
     """
-    Search Amazon for products and return results in markdown format.
+    Search Amazon for products and return results as markdown, JSON, JSON Lines, CSV or TSV.
     
     Args:
         search_term: The term to search for on Amazon
+        max_age: Maximum age in seconds of cached results to accept (default: cache TTL)
+        force_refresh: Skip cached results and run a fresh search (default: False)
+        output_format: "markdown" for a readable list, "json" for structured product
+            records with numeric price and review count, "jsonl" for one JSON record per
+            line, or "csv" / "tsv" for a compact table, the cheapest to read for large
+            result sets (default: "markdown")
+        sort: Result order, one of "relevance", "price-asc", "price-desc", "reviews" or
+            "newest" (default: Amazon's own order)
+        page: Result page to start from (default: 1)
+        max_pages: Maximum number of result pages to read (default: all pages)
+        max_results: Stop once this many products are found, counted before the filters
+            below (default: no limit)
+        min_price: Drop products cheaper than this or without a price
+        max_price: Drop products dearer than this or without a price
+        min_reviews: Drop products with fewer reviews than this
+        sponsored: "include", "exclude" or "only" sponsored products (default: "include")
+        order_by: Sort the returned products by "price", "reviews", "rating" or "rank",
+            prefixed with "-" for descending (default: page order)
+        fields: Product fields to return, e.g. ["title", "price", "asin"] (default: all
+            fields for JSON, the standard list for markdown)
+        deadline: Seconds the search may take; when they run out, the products found so
+            far are returned, flagged by "truncated" in JSON and a closing note in
+            markdown (default: no limit)
         
     Returns:
-        A markdown formatted string containing the search results
+        A string containing the search results in the requested format
     """
+    async def report_progress(products):
+        # Progress is the number of products found so far; the total is not known up front
+        await ctx.report_progress(len(products))
+    
     try:
         # Perform search
         logger.info(f"Processing search for: {search_term}")
-        results, count = await get_amazon_search_results(search_term)
-        return results
+        amazon = load_scraper()
+        amazon.check_result_options(sponsored, order_by, fields, output_format)
+        results = await amazon.get_cached_search_results(
+            search_term,
+            max_age=max_age,
+            force_refresh=force_refresh,
+            on_progress=report_progress if ctx else None,
+            deadline=amazon.Deadline(deadline),
+            sort=sort,
+            page=page,
+            max_pages=max_pages,
+            max_results=max_results
+        )
+        logger.info(f"Search stats: {amazon.get_search_stats()}")
+        results = amazon.refine_results(results, min_price, max_price, min_reviews, sponsored, order_by)
+        return amazon.render_results(results, output_format, fields)
             
     except Exception as e:
         logger.error(f"Error processing search: {str(e)}")
         return f"Error: Search failed - {str(e)}"
 
 @mcp.tool()
-async def add_sponsored_products_to_cart(search_term: str, number_of_products: int = 4) -> dict:
+async def search_amazon_batch(
+    search_terms: List[str],
+    concurrency: Optional[int] = None,
+    max_age: Optional[int] = None,
+    force_refresh: bool = False,
+    output_format: str = "markdown",
+    sort: Optional[str] = None,
+    page: Optional[int] = None,
+    max_pages: Optional[int] = None,
+    max_results: Optional[int] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    min_reviews: Optional[int] = None,
+    sponsored: str = "include",
+    order_by: Optional[str] = None,
+    fields: Optional[List[str]] = None,
+    deadline: Optional[float] = None
+) -> dict:
+    """
+    Search Amazon for many terms in one call.
+    
+    Terms are searched a few at a time over the browser pool, and all batches share one
+    rate limit on new browser searches. Cached terms return immediately.
+    
+    Args:
+        search_terms: The terms to search for on Amazon
+        concurrency: Maximum number of terms searched at once (default and upper limit: browser pool size)
+        max_age, force_refresh, output_format, sort, page, max_pages, max_results,
+            min_price, max_price, min_reviews, sponsored, order_by, fields: As for
+            search_amazon, applied to every term
+        deadline: Seconds the whole batch may take; terms it cuts short return the
+            products found so far and are marked truncated (default: no limit)
+        
+    Returns:
+        A dictionary with the number of failed terms and, per term in input order, the
+        rendered results, product count and truncated flag, or the error message
+    """
+    try:
+        if not search_terms:
+            raise ValueError("search_terms must be a non-empty list")
+        amazon = load_scraper()
+        amazon.check_result_options(sponsored, order_by, fields, output_format)
+        
+        logger.info(f"Processing batch search for {len(search_terms)} terms")
+        outcomes = await amazon.search_amazon_batch(
+            search_terms,
+            concurrency=concurrency,
+            max_age=max_age,
+            force_refresh=force_refresh,
+            deadline=amazon.Deadline(deadline),
+            sort=sort,
+            page=page,
+            max_pages=max_pages,
+            max_results=max_results
+        )
+        
+        items = []
+        for outcome in outcomes:
+            if outcome['error'] is not None:
+                items.append({'search_term': outcome['search_term'], 'error': outcome['error']})
+                continue
+            results = amazon.refine_results(outcome['results'], min_price, max_price, min_reviews, sponsored, order_by)
+            items.append({
+                'search_term': outcome['search_term'],
+                'count': results.count,
+                'truncated': results.truncated,
+                'results': amazon.render_results(results, output_format, fields)
+            })
+        logger.info(f"Search stats: {amazon.get_search_stats()}")
+        return {
+            'status': 'success',
+            'failed': sum(1 for item in items if 'error' in item),
+            'results': items
+        }
+    
+    except Exception as e:
+        logger.error(f"Error processing batch search: {str(e)}")
+        return {
+            'status': 'error',
+            'message': str(e),
+            'results': []
+        }
+
+@mcp.tool()
+async def add_sponsored_products_to_cart(search_term: str, number_of_products: int = 4,
+                                         deadline: Optional[float] = None) -> dict:
     """
     Add sponsored products to cart by calling add_top_sponsored_products_to_cart from amazon_scraper.py.
     
     Args:
         search_term: The search term to find sponsored products
         number_of_products: Number of products to add to cart (default: 4)
+        deadline: Seconds the call may take; when they run out, the products added so
+            far are returned and truncated is true (default: no limit)
         
     Returns:
-        A dictionary containing the status and list of added products
+        A dictionary containing the status, the list of added products and whether the
+        deadline cut the call short
     """
     try:
         # Validate input parameters
@@ -74,16 +226,21 @@ async def add_sponsored_products_to_cart(search_term: str, number_of_products: i
         if not isinstance(number_of_products, int) or number_of_products <= 0:
             raise ValueError("number_of_products must be a positive integer")
             
+        amazon = load_scraper()
+        call_deadline = amazon.Deadline(deadline)
         logger.info(f"Processing add to cart request for {number_of_products} products")
         
         # Call add_top_sponsored_products_to_cart from amazon_scraper.py
-        added_products = await add_top_sponsored_products_to_cart(search_term, number_of_products)
+        added_products = await amazon.add_top_sponsored_products_to_cart(
+            search_term, number_of_products, deadline=call_deadline
+        )
         
         # Format response
         response = {
             'status': 'success' if added_products else 'warning',
             'message': f'Successfully added {len(added_products)} products to cart' if added_products else 'No products were added to cart',
-            'products': added_products if added_products else []
+            'products': added_products if added_products else [],
+            'truncated': call_deadline.exceeded
         }
         
         logger.info(f"Response: {response}")
@@ -107,11 +264,16 @@ async def add_sponsored_products_to_cart(search_term: str, number_of_products: i
 def run_server():
     """Run the MCP server"""
     try:
+        # Warm start trades a slower handshake for a fast first search, so it loads the scraper now
+        warm_start_browsers = int(os.getenv('WARM_START_BROWSERS', '0'))
+        if warm_start_browsers > 0:
+            load_scraper().warm_start(warm_start_browsers)
         logger.info("Starting server...")
         mcp.run(transport='stdio')
     except Exception as e:
         logger.error(f"Server error: {str(e)}")
-        cleanup_driver()
+        if scraper is not None:
+            scraper.cleanup_driver()
         sys.exit(1)
 
 if __name__ == "__main__":
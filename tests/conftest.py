@@ -0,0 +1,70 @@
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import amazon_scraper
+
+
+class FakeDriver:
+    """Stand-in for a Chrome WebDriver whose page loads block for load_seconds"""
+
+    session_id = 'fake'
+
+    def __init__(self, load_seconds=1.0):
+        self.load_seconds = load_seconds
+        self.loading = False
+        self.current_url = 'about:blank'
+        self.page_source = '<html></html>'
+
+    def get(self, url):
+        self.loading = True
+        try:
+            time.sleep(self.load_seconds)
+            self.current_url = url
+        finally:
+            self.loading = False
+
+    def refresh(self):
+        pass
+
+    def find_elements(self, by, selector):
+        return []
+
+    def execute_script(self, script, *args):
+        return 0
+
+    def quit(self):
+        pass
+
+
+@pytest.fixture
+def fake_pool(monkeypatch):
+    """Replace driver_pool with a one-browser pool of FakeDrivers
+
+    pool.drivers lists the browsers started, and pool.checkins records, for every
+    checkin, whether the browser was still loading a page at that moment.
+    """
+    drivers = []
+
+    def factory():
+        drivers.append(FakeDriver())
+        return drivers[-1]
+
+    pool = amazon_scraper.DriverPool(max_size=1, factory=factory)
+    pool.drivers = drivers
+    pool.checkins = []
+    checkin = pool.checkin
+
+    def recording_checkin(driver):
+        pool.checkins.append(driver.loading)
+        checkin(driver)
+
+    monkeypatch.setattr(pool, 'checkin', recording_checkin)
+    monkeypatch.setattr(amazon_scraper, 'driver_pool', pool)
+    monkeypatch.setattr(amazon_scraper, 'navigation_rate_limiter', amazon_scraper.RateLimiter(0))
+    yield pool
+    pool.close()
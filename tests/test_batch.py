@@ -0,0 +1,47 @@
+import asyncio
+
+import amazon_scraper
+
+
+def test_batch_concurrency_is_capped_at_the_pool_size(monkeypatch):
+    active = []
+    peak = []
+
+    async def fake_search(search_term, **options):
+        active.append(search_term)
+        peak.append(len(active))
+        await asyncio.sleep(0.02)
+        active.remove(search_term)
+        return amazon_scraper.SearchResults(search_term=search_term, products=[])
+
+    pool = amazon_scraper.DriverPool(max_size=2, factory=lambda: None)
+    monkeypatch.setattr(amazon_scraper, 'driver_pool', pool)
+    monkeypatch.setattr(amazon_scraper, 'batch_rate_limiter', amazon_scraper.RateLimiter(0))
+    monkeypatch.setattr(amazon_scraper, 'get_cached_search_results', fake_search)
+
+    terms = [f'term {index}' for index in range(8)]
+    outcomes = asyncio.run(amazon_scraper.search_amazon_batch(terms, concurrency=8, force_refresh=True))
+    assert [outcome['search_term'] for outcome in outcomes] == terms
+    assert max(peak) == 2
+
+
+def test_duplicate_terms_share_one_run_under_a_deadline(monkeypatch):
+    runs = []
+
+    async def fake_search(search_term, on_progress=None, deadline=None, **options):
+        runs.append(search_term)
+        await asyncio.sleep(0.02)
+        return amazon_scraper.SearchResults(search_term=search_term, products=[])
+
+    monkeypatch.setattr(amazon_scraper, 'search_amazon_products', fake_search)
+    monkeypatch.setattr(amazon_scraper, 'search_cache', amazon_scraper.SearchResultCache())
+    limiter = amazon_scraper.RateLimiter(6000)
+    monkeypatch.setattr(amazon_scraper, 'batch_rate_limiter', limiter)
+
+    terms = ['usb', 'USB ', 'usb', 'hdmi']
+    outcomes = asyncio.run(amazon_scraper.search_amazon_batch(terms, deadline=amazon_scraper.Deadline(30)))
+    assert sorted(runs) == ['hdmi', 'usb']
+    assert limiter.stats()['acquired'] == 2
+    assert [outcome['search_term'] for outcome in outcomes] == terms
+    assert outcomes[0]['results'] is outcomes[1]['results'] is outcomes[2]['results']
+    assert all(outcome['error'] is None for outcome in outcomes)
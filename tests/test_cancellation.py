@@ -0,0 +1,75 @@
+import asyncio
+import time
+
+import anyio
+import pytest
+
+import amazon_scraper
+
+
+async def consume_stream():
+    async for _ in amazon_scraper.stream_search_results('usb cable', force_refresh=True):
+        pass
+
+
+async def wait_until_loading(pool):
+    """Return once the pool's browser is inside a blocking page load"""
+    while not any(driver.loading for driver in pool.drivers):
+        await asyncio.sleep(0.01)
+
+
+def assert_released_after_worker_stopped(pool, elapsed):
+    # The browser went back exactly once, and only after the page load returned
+    assert pool.checkins == [False]
+    assert pool.stats()['in_use'] == 0
+    # Within one blocking step of the cancel, not after the whole search
+    assert elapsed < pool.drivers[0].load_seconds + 0.5
+
+
+def test_task_cancel_frees_browser_once_worker_stops(fake_pool):
+    async def main():
+        task = asyncio.ensure_future(consume_stream())
+        await wait_until_loading(fake_pool)
+        started_at = time.monotonic()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return time.monotonic() - started_at
+
+    assert_released_after_worker_stopped(fake_pool, asyncio.run(main()))
+
+
+def test_anyio_cancel_scope_frees_browser_once_worker_stops(fake_pool):
+    # Starlette's StreamingResponse and the MCP session cancel through anyio, which
+    # re-cancels the task at every await while the scope is cancelled
+    async def main():
+        async with anyio.create_task_group() as task_group:
+            task_group.start_soon(consume_stream)
+            await wait_until_loading(fake_pool)
+            started_at = time.monotonic()
+            task_group.cancel_scope.cancel()
+        return time.monotonic() - started_at
+
+    assert_released_after_worker_stopped(fake_pool, asyncio.run(main()))
+
+
+def test_last_caller_cancel_cancels_shared_run(fake_pool):
+    async def main():
+        callers = [
+            asyncio.ensure_future(amazon_scraper.get_cached_search_results('hdmi', force_refresh=True))
+            for _ in range(2)
+        ]
+        await wait_until_loading(fake_pool)
+        started_at = time.monotonic()
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        while fake_pool.stats()['in_use']:
+            await asyncio.sleep(0.01)
+        return time.monotonic() - started_at
+
+    cancelled_runs = amazon_scraper.single_flight_stats['cancelled']
+    elapsed = asyncio.run(main())
+    assert_released_after_worker_stopped(fake_pool, elapsed)
+    assert amazon_scraper.single_flight_stats['cancelled'] == cancelled_runs + 1
+    assert not amazon_scraper._inflight_searches
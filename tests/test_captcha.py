@@ -0,0 +1,50 @@
+import pytest
+
+import amazon_scraper
+from conftest import FakeDriver
+
+
+class PageDriver(FakeDriver):
+    """FakeDriver showing either a results page or the CAPTCHA form"""
+
+    def __init__(self, captcha):
+        super().__init__(load_seconds=0)
+        self.captcha = captcha
+
+    def find_elements(self, by, selector):
+        if self.captcha:
+            return ['form'] if 'validateCaptcha' in selector else []
+        return ['results'] if 'div.s-main-slot' in selector else []
+
+    @property
+    def page_source(self):
+        raise AssertionError("the page source should not be read")
+
+    @page_source.setter
+    def page_source(self, value):
+        pass
+
+
+@pytest.fixture
+def captcha_calls(monkeypatch):
+    calls = []
+
+    def fake_handle_captcha(driver, max_retries=3):
+        calls.append(driver)
+        driver.captcha = False
+        return True
+
+    monkeypatch.setattr(amazon_scraper, 'handle_captcha', fake_handle_captcha)
+    monkeypatch.setattr(amazon_scraper, 'navigation_rate_limiter', amazon_scraper.RateLimiter(0))
+    return calls
+
+
+def test_results_page_skips_captcha_handling(captcha_calls):
+    assert amazon_scraper._open_search_url(PageDriver(captcha=False), 'usb cable')
+    assert captcha_calls == []
+
+
+def test_captcha_form_is_handled(captcha_calls):
+    driver = PageDriver(captcha=True)
+    assert amazon_scraper._open_search_url(driver, 'usb cable')
+    assert captcha_calls == [driver]
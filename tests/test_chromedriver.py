@@ -0,0 +1,49 @@
+import json
+import os
+
+from selenium.common.exceptions import SessionNotCreatedException
+
+import amazon_scraper
+from conftest import FakeDriver
+
+
+def make_executable(path):
+    path.write_text('')
+    path.chmod(0o755)
+    return str(path)
+
+
+def test_stale_pinned_chromedriver_is_resolved_again(tmp_path, monkeypatch):
+    stale_path = make_executable(tmp_path / 'chromedriver-119')
+    fresh_path = make_executable(tmp_path / 'chromedriver-120')
+    cache_file = tmp_path / 'chromedriver.json'
+    cache_file.write_text(json.dumps({'path': stale_path}))
+    installs = []
+    sessions = []
+
+    class FakeChromeDriverManager:
+        def install(self):
+            installs.append(fresh_path)
+            return fresh_path
+
+    def fake_chrome(service, options):
+        sessions.append(service.path)
+        if service.path == stale_path:
+            raise SessionNotCreatedException("This version of ChromeDriver only supports Chrome version 119")
+        return FakeDriver(load_seconds=0)
+
+    monkeypatch.setattr(amazon_scraper, 'CHROMEDRIVER_CACHE_FILE', str(cache_file))
+    monkeypatch.setattr(amazon_scraper, 'chromedriver_path', None)
+    monkeypatch.setattr(amazon_scraper, 'ChromeDriverManager', FakeChromeDriverManager)
+    monkeypatch.setattr(amazon_scraper.webdriver, 'Chrome', fake_chrome)
+
+    assert amazon_scraper.setup_driver() is not None
+    assert sessions == [stale_path, fresh_path]
+    assert installs == [fresh_path]
+    assert json.loads(cache_file.read_text())['path'] == fresh_path
+
+    # The next browser starts straight from the re-pinned path
+    assert amazon_scraper.setup_driver() is not None
+    assert sessions[-1] == fresh_path
+    assert installs == [fresh_path]
+    assert os.path.exists(amazon_scraper.chromedriver_path)
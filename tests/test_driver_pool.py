@@ -0,0 +1,29 @@
+import time
+
+import amazon_scraper
+from conftest import FakeDriver
+
+
+def test_idle_browsers_are_evicted_without_a_checkout():
+    quit_drivers = []
+
+    class QuittableDriver(FakeDriver):
+        def quit(self):
+            quit_drivers.append(self)
+
+    pool = amazon_scraper.DriverPool(max_size=2, idle_timeout=0.1, factory=QuittableDriver,
+                                     eviction_interval=0.05)
+    try:
+        driver = pool.checkout()
+        pool.checkin(driver)
+        waited_until = time.monotonic() + 2
+        while not quit_drivers and time.monotonic() < waited_until:
+            time.sleep(0.02)
+        assert quit_drivers == [driver]
+        assert pool.stats()['size'] == 0
+        assert pool.stats()['evicted'] == 1
+    finally:
+        pool.close()
+    # close() stops the eviction thread
+    pool._evictor.join(1)
+    assert not pool._evictor.is_alive()
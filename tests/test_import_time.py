@@ -0,0 +1,32 @@
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# server.py was measured at about 550 ms, nearly all of it the mcp package; the budget
+# leaves room for slower machines but fails if a browser stack import creeps back in
+IMPORT_TIME_BUDGET = 2.0
+DEFERRED_MODULES = ('amazon_scraper', 'selenium', 'bs4', 'webdriver_manager')
+
+
+def import_times(module):
+    """Return {module name: cumulative import seconds} from python -X importtime"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=REPO_ROOT, capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def test_server_import_defers_the_browser_stack():
+    times = import_times('server')
+    imported = {name.split('.')[0] for name in times}
+    assert not imported & set(DEFERRED_MODULES)
+    assert times['server'] < IMPORT_TIME_BUDGET
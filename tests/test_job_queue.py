@@ -0,0 +1,108 @@
+import asyncio
+import json
+
+import amazon_scraper
+import fastserver
+
+
+def write_job(jobs_dir, job_id, key, status, created_at):
+    job = {
+        'id': job_id,
+        'key': key,
+        'status': status,
+        'request': {'search_term': key},
+        'products': [],
+        'truncated': False,
+        'error': None,
+        'created_at': created_at,
+        'started_at': created_at,
+        'finished_at': created_at
+    }
+    (jobs_dir / f'{job_id}.json').write_text(json.dumps(job))
+
+
+def test_start_prefers_the_job_that_did_not_fail(tmp_path):
+    # File names sort in the opposite order to the jobs' history
+    write_job(tmp_path, 'c-first-try', 'usb cable', 'failed', '2026-10-17T10:00:00')
+    write_job(tmp_path, 'b-retry', 'usb cable', 'done', '2026-10-17T10:05:00')
+    write_job(tmp_path, 'a-third-try', 'usb cable', 'failed', '2026-10-17T10:10:00')
+    write_job(tmp_path, 'e-older', 'hdmi', 'failed', '2026-10-17T09:00:00')
+    write_job(tmp_path, 'd-newer', 'hdmi', 'cancelled', '2026-10-17T09:30:00')
+
+    async def main():
+        queue = fastserver.SearchJobQueue(jobs_dir=str(tmp_path), ttl=10 ** 9)
+        await queue.start()
+        await queue.stop()
+        return queue._job_ids
+
+    assert asyncio.run(main()) == {'usb cable': 'b-retry', 'hdmi': 'd-newer'}
+
+
+def test_stop_cancels_running_searches(tmp_path, monkeypatch):
+    started = []
+    stopped = []
+
+    async def endless_search(search_term, on_progress=None, deadline=None, **options):
+        started.append(search_term)
+        try:
+            await asyncio.sleep(3600)
+        finally:
+            stopped.append(search_term)
+
+    monkeypatch.setattr(amazon_scraper, 'search_amazon_products', endless_search)
+
+    async def main():
+        queue = fastserver.SearchJobQueue(jobs_dir=str(tmp_path), workers=1)
+        await queue.start()
+        job = queue.submit(fastserver.SearchRequest(search_term='usb cable', force_refresh=True))
+        while not started:
+            await asyncio.sleep(0.01)
+        running = list(queue._running.values())
+        await queue.stop()
+        # Checked before asyncio.run cancels whatever stop() left behind
+        assert stopped == ['usb cable']
+        assert all(task.done() for task in running)
+        return job
+
+    job = asyncio.run(main())
+    # The interrupted job stays saved as running, so the next start queues it again
+    saved = json.loads((tmp_path / f"{job['id']}.json").read_text())
+    assert saved['status'] == 'running'
+
+
+def test_jobs_share_browser_runs_with_each_other_and_search(tmp_path, monkeypatch):
+    runs = []
+
+    async def fake_search(search_term, on_progress=None, deadline=None, **options):
+        runs.append(search_term)
+        products = [amazon_scraper.Product(
+            title='USB cable', price=9.99, price_text='$9.99', num_reviews=12, sponsored=False,
+            asin='B000000001', rank='1', link='/dp/B000000001', currency='USD', star_rating=4.5,
+            repeat_buyers=None
+        )]
+        await asyncio.sleep(0.05)
+        if on_progress:
+            await on_progress(products)
+        return amazon_scraper.SearchResults(search_term=search_term, products=products)
+
+    monkeypatch.setattr(amazon_scraper, 'search_amazon_products', fake_search)
+    monkeypatch.setattr(amazon_scraper, 'search_cache', amazon_scraper.SearchResultCache())
+
+    async def main():
+        queue = fastserver.SearchJobQueue(jobs_dir=str(tmp_path), workers=2)
+        await queue.start()
+        jobs = [
+            queue.submit(fastserver.SearchRequest(search_term='usb cable', output_format='json')),
+            queue.submit(fastserver.SearchRequest(search_term='USB cable', output_format='csv', min_price=5))
+        ]
+        direct = await fastserver.get_cached_search_results('usb cable')
+        while any(job['status'] != 'done' for job in jobs):
+            await asyncio.sleep(0.01)
+        await queue.stop()
+        return jobs, direct
+
+    jobs, direct = asyncio.run(main())
+    assert runs == ['usb cable']
+    assert direct.count == 1
+    assert fastserver.job_response(jobs[0]).products[0].asin == 'B000000001'
+    assert fastserver.job_response(jobs[1]).results.startswith('title,')
@@ -0,0 +1,86 @@
+import pytest
+
+import amazon_scraper
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('1,234', 1234),
+    ('(1,234)', 1234),
+    ('119,455', 119455),
+    ('(1.2K)', 1200),
+    ('12K+', 12000),
+    ('2M', 2000000),
+    ('1.5m', 1500000),
+    ('4,5K', 4500),
+    ('1.234', 1234),
+    ('1.234.567', 1234567),
+    ('87', 87),
+    ('no ratings', None),
+])
+def test_parse_count(text, expected):
+    assert amazon_scraper.parse_count(text) == expected
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('$1,299.99', (1299.99, 'USD')),
+    ('$24.99', (24.99, 'USD')),
+    ('US$5.00', (5.0, 'USD')),
+    ('CA$19.99', (19.99, 'CAD')),
+    ('£1,234.56', (1234.56, 'GBP')),
+    ('£1.234,56', (1234.56, 'GBP')),
+    ('€9,99', (9.99, 'EUR')),
+    ('12,99 €', (12.99, 'EUR')),
+    ('1.234,56\xa0€', (1234.56, 'EUR')),
+    ('¥1,980', (1980.0, 'JPY')),
+    ('₹499', (499.0, 'INR')),
+    ('19.99', (19.99, None)),
+    ('', (None, None)),
+])
+def test_parse_price_text(text, expected):
+    assert amazon_scraper.parse_price_text(text) == expected
+
+
+def test_normalize_card_fields_reads_every_field():
+    fields = {
+        'price': '$1,299.99',
+        'ratings_label': '119,455 global ratings',
+        'star_label': '4.5 out of 5 stars',
+        'repeat_buyers': '10K+ bought multiple times'
+    }
+    assert amazon_scraper.normalize_card_fields(fields) == {
+        'price': 1299.99,
+        'currency': 'USD',
+        'num_reviews': 119455,
+        'star_rating': 4.5,
+        'repeat_buyers': 10000
+    }
+
+
+@pytest.mark.parametrize('fields, num_reviews', [
+    ({'ratings_label': '1 rating'}, 1),
+    ({'ratings_label': '4,5K ratings'}, 4500),
+    ({'ratings_label': '(1,234)'}, 1234),
+    ({'review_abbr': '(1.2K)'}, 1200),
+    ({'review_abbr': '12K+'}, 12000),
+    ({'review_abbr': '2M'}, 2000000),
+    ({}, None),
+])
+def test_normalize_card_fields_rating_count(fields, num_reviews):
+    assert amazon_scraper.normalize_card_fields(fields)['num_reviews'] == num_reviews
+
+
+def test_normalize_card_fields_decimal_comma_storefront():
+    normalized = amazon_scraper.normalize_card_fields({'price': '1.234,56 €', 'ratings_label': '4,5K ratings'})
+    assert normalized['price'] == 1234.56
+    assert normalized['currency'] == 'EUR'
+    assert normalized['num_reviews'] == 4500
+
+
+def test_normalize_card_fields_missing_fields():
+    assert amazon_scraper.normalize_card_fields({}) == {
+        'price': None,
+        'currency': None,
+        'num_reviews': None,
+        'star_rating': None,
+        'repeat_buyers': None
+    }
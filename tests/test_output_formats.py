@@ -0,0 +1,31 @@
+import os
+
+import amazon_scraper
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def fixture_results():
+    with open(os.path.join(FIXTURES, 'search_results_page.html'), encoding='utf-8') as f:
+        html = f.read()
+    products = amazon_scraper.parse_search_results_html(html)
+    return amazon_scraper.SearchResults(search_term='usb cable', products=products)
+
+
+def test_compare_output_formats_ranks_the_formats():
+    sizes = amazon_scraper.compare_output_formats(fixture_results())
+    tokens = {name: size['approx_tokens'] for name, size in sizes.items()}
+    assert set(tokens) == set(amazon_scraper.OUTPUT_FORMATS)
+    assert tokens['tsv'] <= tokens['csv'] < tokens['markdown'] < tokens['jsonl'] <= tokens['json']
+    assert sizes['tsv']['bytes'] <= sizes['csv']['bytes'] < sizes['markdown']['bytes'] < sizes['json']['bytes']
+
+
+def test_csv_and_tsv_separators_cost_the_same():
+    results = fixture_results()
+    sizes = amazon_scraper.compare_output_formats(results)
+    csv_text = amazon_scraper.render_results(results, 'csv')
+    tsv_text = amazon_scraper.render_results(results, 'tsv')
+    # The same cells, so the only token difference is the quotes CSV puts around commas
+    quotes = csv_text.count('"') - tsv_text.count('"')
+    assert quotes > 0
+    assert sizes['csv']['approx_tokens'] - sizes['tsv']['approx_tokens'] == quotes
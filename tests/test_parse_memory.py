@@ -0,0 +1,78 @@
+import gc
+import tracemalloc
+
+import pytest
+from bs4.element import PageElement
+
+import amazon_scraper
+
+
+def card(index):
+    asin = 'B0%08d' % index
+    return (
+        f'<div data-asin="{asin}" data-index="{index}" data-component-type="s-search-result" class="s-result-item">'
+        f'<h2><a class="a-link-normal" href="/Product-{index}/dp/{asin}"><span>Product {index}</span></a></h2>'
+        f'<span class="a-icon-alt">4.5 out of 5 stars</span><a aria-label="{1000 + index:,} ratings" href="#">(1K)</a>'
+        f'<span class="a-price"><span class="a-offscreen">${index + 5}.99</span></span></div>'
+    )
+
+
+def synthetic_page(cards=30):
+    """A results page whose navigation and footer outweigh the cards, like the real one"""
+    nav = '<div id="nav">' + '<a href="#">link</a>' * 200 + '</div>'
+    footer = '<div id="footer">' + '<p>footer text</p>' * 200 + '</div>'
+    results = ''.join(card(index) for index in range(cards))
+    return f'<html><body>{nav}<div class="s-main-slot s-result-list">{results}</div>{footer}</body></html>'
+
+
+def traced_after_passes(html, parser, passes):
+    """Run passes parses and return the traced (current, peak) memory over them"""
+    tracemalloc.reset_peak()
+    for _ in range(passes):
+        cards = amazon_scraper.read_cards_from_html(html, parser)
+    assert len(cards) == 30
+    del cards
+    return tracemalloc.get_traced_memory()
+
+
+def test_repeated_scroll_passes_keep_memory_flat():
+    html = synthetic_page()
+    # Warm the selector and pattern caches before measuring
+    amazon_scraper.read_cards_from_html(html)
+    # With the GC off, card trees left in reference cycles would pile up pass after pass
+    gc.disable()
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        current_few, peak_few = traced_after_passes(html, 'html.parser', 5)
+        current_many, peak_many = traced_after_passes(html, 'html.parser', 40)
+    finally:
+        tracemalloc.stop()
+        gc.enable()
+    # What is left after the passes, and the most held during any one pass, both stay put
+    assert current_many - current_few < 64 * 1024
+    assert peak_many - peak_few < 64 * 1024
+    # One pass holds well under the 1.2 MB a whole-page soup took
+    assert peak_many - baseline < 1024 * 1024
+
+
+@pytest.mark.parametrize('parser', ['html.parser', 'lxml'])
+def test_card_trees_are_not_left_for_the_gc(parser):
+    # lxml's own parser object is freed by the GC, so tracemalloc alone cannot tell whether
+    # card trees leak under that backend; look at what the GC would have to reclaim instead
+    if parser == 'lxml':
+        pytest.importorskip('lxml')
+    html = synthetic_page()
+    gc.collect()
+    gc.disable()
+    gc.set_debug(gc.DEBUG_SAVEALL)
+    try:
+        for _ in range(5):
+            amazon_scraper.read_cards_from_html(html, parser)
+        gc.collect()
+        leaked = [obj for obj in gc.garbage if isinstance(obj, PageElement)]
+    finally:
+        gc.set_debug(0)
+        gc.garbage.clear()
+        gc.enable()
+    assert leaked == []
@@ -0,0 +1,51 @@
+import os
+
+import pytest
+
+import amazon_scraper
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+@pytest.fixture(scope='module')
+def saved_page():
+    with open(os.path.join(FIXTURES, 'search_results_page.html'), encoding='utf-8') as f:
+        return f.read()
+
+
+def test_installed_backends_match_html_parser(saved_page):
+    report = amazon_scraper.check_parser_backends(saved_page)
+    assert set(report) == set(amazon_scraper.PARSER_BACKENDS)
+    installed = {backend: matched for backend, matched in report.items() if matched is not None}
+    assert 'html.parser' in installed
+    assert all(installed.values()), report
+
+
+@pytest.mark.parametrize('parser', amazon_scraper.PARSER_BACKENDS)
+def test_saved_page_records(saved_page, parser):
+    if parser == 'lxml':
+        pytest.importorskip('lxml')
+    if parser == 'selectolax' and amazon_scraper.LexborHTMLParser is None:
+        pytest.skip('selectolax is not installed')
+    products = amazon_scraper.parse_search_results_html(saved_page, parser)
+    # 24 cards, two of them without a price
+    assert len(products) == 22
+    assert [product.rank for product in products[:8]] == ['1', '2', '3', '4', '5', '6', '8', '9']
+    assert sum(product.sponsored for product in products) == 3
+
+    sponsored = products[0]
+    assert sponsored.title == 'Anker USB C Cable, 6 ft Nylon Braided Fast Charging Cord'
+    assert sponsored.sponsored is True
+    assert sponsored.asin == 'B0CX007919'
+    assert sponsored.price == 8.99
+    assert sponsored.price_text == '$8.99'
+    assert sponsored.currency == 'USD'
+    assert sponsored.num_reviews == 187
+    assert sponsored.star_rating == 4.1
+    assert sponsored.link.startswith('https://www.amazon.com/sspa/click?')
+
+    no_reviews = next(product for product in products if product.rank == '5')
+    assert no_reviews.num_reviews is None
+    assert no_reviews.star_rating is None
+    assert no_reviews.sponsored is False
+    assert no_reviews.link == 'https://www.amazon.com/Product-5/dp/B0CX039595/ref=sr_1_5?keywords=usb+cable'
@@ -0,0 +1,58 @@
+import asyncio
+import threading
+
+import pytest
+
+import amazon_scraper
+
+
+def drained_limiter():
+    """A 60/min limiter whose only burst token is spent, so the next caller waits about 1s"""
+    limiter = amazon_scraper.RateLimiter(60)
+    limiter.acquire()
+    return limiter
+
+
+def assert_token_returned(limiter):
+    # Only the first token was used, and the next caller waits one interval, not two
+    assert limiter.stats()['acquired'] == 1
+    assert limiter.stats()['max_wait_seconds'] == 0.0
+    assert limiter._reserve() <= 1.0
+
+
+def test_cancelled_acquire_gives_its_token_back():
+    limiter = drained_limiter()
+    cancel_event = threading.Event()
+    cancel_event.set()
+    with pytest.raises(amazon_scraper.BrowserWorkCancelled):
+        amazon_scraper._run_cancellable(cancel_event, None, limiter.acquire)
+    assert_token_returned(limiter)
+
+
+def test_acquire_past_the_deadline_gives_its_token_back():
+    limiter = drained_limiter()
+    deadline = amazon_scraper.Deadline(0.1)
+    with pytest.raises(amazon_scraper.DeadlineExceeded):
+        amazon_scraper._run_cancellable(threading.Event(), deadline, limiter.acquire)
+    assert_token_returned(limiter)
+
+
+def test_cancelled_acquire_async_gives_its_token_back():
+    limiter = drained_limiter()
+
+    async def main():
+        task = asyncio.ensure_future(limiter.acquire_async())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert_token_returned(limiter)
+
+
+def test_acquire_async_cut_short_by_the_deadline_gives_its_token_back():
+    limiter = drained_limiter()
+    waited = asyncio.run(limiter.acquire_async(amazon_scraper.Deadline(0.05)))
+    assert waited <= 0.05
+    assert_token_returned(limiter)
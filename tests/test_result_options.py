@@ -0,0 +1,32 @@
+import asyncio
+
+import pytest
+
+import amazon_scraper
+import server
+
+
+@pytest.fixture
+def no_search(monkeypatch):
+    async def unexpected_search(*args, **kwargs):
+        raise AssertionError("the search should not start")
+
+    monkeypatch.setattr(amazon_scraper, 'get_cached_search_results', unexpected_search)
+    monkeypatch.setattr(amazon_scraper, 'search_amazon_batch', unexpected_search)
+
+
+def test_check_result_options_rejects_unknown_output_format():
+    with pytest.raises(ValueError, match='output_format'):
+        amazon_scraper.check_result_options(output_format='xml')
+    amazon_scraper.check_result_options(output_format='tsv')
+
+
+def test_mcp_search_rejects_output_format_before_searching(no_search):
+    result = asyncio.run(server.search_amazon('usb cable', output_format='xml'))
+    assert result.startswith('Error:')
+    assert 'output_format' in result
+
+
+def test_mcp_batch_rejects_output_format_before_searching(no_search):
+    result = asyncio.run(server.search_amazon_batch(['usb cable'], output_format='xml'))
+    assert 'output_format' in str(result)
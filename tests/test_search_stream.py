@@ -0,0 +1,27 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import fastserver
+
+
+@pytest.fixture
+def client(monkeypatch):
+    async def unexpected_search(search_term, **options):
+        raise AssertionError("the search should not start")
+        yield []
+
+    monkeypatch.setattr(fastserver, 'stream_search_results', unexpected_search)
+    # Without the context manager the startup hooks (job queue, warm start) do not run
+    return TestClient(fastserver.app)
+
+
+@pytest.mark.parametrize('options', [
+    {'page': 0},
+    {'sort': 'cheapest'},
+    {'max_pages': 0},
+    {'max_results': 0},
+])
+def test_stream_rejects_invalid_search_options_before_streaming(client, options):
+    response = client.post('/search/stream', json={'search_term': 'usb cable', **options})
+    assert response.status_code == 422
+    assert 'detail' in response.json()
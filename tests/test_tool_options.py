@@ -0,0 +1,30 @@
+import inspect
+import json
+import os
+
+import fastserver
+import server
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def manifest_options(tool_name):
+    with open(os.path.join(REPO_ROOT, 'claude_desktop.json'), encoding='utf-8') as f:
+        tools = {tool['name']: tool for tool in json.load(f)['tools']}
+    return set(tools[tool_name]['parameters']['properties'])
+
+
+def tool_options(tool):
+    return set(inspect.signature(tool).parameters) - {'ctx'}
+
+
+def test_search_tool_endpoint_and_manifest_list_the_same_options():
+    endpoint = set(fastserver.SearchRequest.model_fields)
+    assert tool_options(server.search_amazon) == endpoint
+    assert manifest_options('search_amazon') == endpoint
+
+
+def test_batch_tool_endpoint_and_manifest_list_the_same_options():
+    endpoint = set(fastserver.BatchSearchRequest.model_fields)
+    assert tool_options(server.search_amazon_batch) == endpoint
+    assert manifest_options('search_amazon_batch') == endpoint